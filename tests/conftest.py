@@ -1,4 +1,7 @@
 import os
+import shutil
+
+import pytest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -37,3 +40,15 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_settings():
+    """Кэш и медиа во временной папке, а не у запущенного сайта."""
+    from core.testing import isolated_settings
+
+    directory, isolated = isolated_settings()
+    isolated.enable()
+    yield
+    isolated.disable()
+    shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,36 @@
+from django.contrib import admin
+
+from .models import DeadTask, Task
+from .tasks import retry_tasks
+
+
+def retry(modeladmin, request, queryset):
+    count = retry_tasks(queryset)
+    modeladmin.message_user(request, f'Возвращено в очередь: {count}')
+
+
+retry.short_description = 'Повторить выбранные задачи'
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at', 'created')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created',)
+    actions = (retry,)
+
+
+class DeadTaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'attempts', 'created', 'last_error')
+    list_filter = ('name',)
+    readonly_fields = (
+        'name', 'args', 'attempts', 'max_attempts', 'last_error', 'created',
+    )
+    exclude = ('status', 'run_at')
+    actions = (retry,)
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(Task, TaskAdmin)
+admin.site.register(DeadTask, DeadTaskAdmin)
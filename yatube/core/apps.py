@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def clear_cache(sender, **kwargs):
+    """Общий кэш переживает процессы, поэтому сбрасывается после migrate:
+    иначе новая схема или пересозданная тестовая база встретит старые
+    страницы и версии списков."""
+    from django.core.cache import cache
+    cache.clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(clear_cache, sender=self)
@@ -0,0 +1,220 @@
+"""Кэш в файле SQLite, общий для всех процессов на одном сервере.
+
+LocMemCache держит отдельную копию кэша в каждом воркере, поэтому
+сброс версии в одном процессе не виден остальным. Здесь все воркеры
+читают и пишут одну таблицу, а при переполнении вытесняются записи,
+которые дольше всего не читали (LRU).
+
+COUNT(*) — полный проход по таблице, поэтому размер проверяется не на
+каждой записи, а на каждой OPTIONS['CULL_EVERY']-й записи процесса (по
+умолчанию 100). Между проверками кэш может вырасти сверх MAX_ENTRIES
+на столько записей от каждого процесса.
+"""
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    max_query_params = 500
+    lru_resolution = 1
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        self._local = threading.local()
+        options = params.get('OPTIONS', {})
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._writes = itertools.count()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _transaction(self, begin='BEGIN IMMEDIATE'):
+        return _Transaction(self._db, begin)
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        now = time.time()
+        found, touched = {}, []
+        names = list(keys)
+        with self._transaction('BEGIN') as db:
+            for start in range(0, len(names), self.max_query_params):
+                chunk = names[start:start + self.max_query_params]
+                rows = db.execute(
+                    'SELECT key, value, accessed FROM cache'
+                    f' WHERE key IN ({", ".join("?" * len(chunk))})'
+                    ' AND (expires IS NULL OR expires > ?)',
+                    (*chunk, now),
+                ).fetchall()
+                for key, value, accessed in rows:
+                    found[keys[key]] = pickle.loads(value)
+                    if accessed < now - self.lru_resolution:
+                        touched.append((now, key))
+        if touched:
+            # Горячие ключи не переписываются на каждое чтение:
+            # для LRU хватает точности в lru_resolution секунд.
+            with self._transaction() as db:
+                db.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?', touched
+                )
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self._key(key, version), self._dumps(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)', rows
+            )
+            self._cull(db, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now)
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?)',
+                (key, self._dumps(value),
+                 self.get_backend_timeout(timeout), now),
+            ).rowcount == 1
+            if added:
+                self._cull(db, now)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ?'
+                ' AND (expires IS NULL OR expires > ?)', (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (self._dumps(value), now, key),
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            return db.execute(
+                'UPDATE cache SET expires = ?, accessed = ? WHERE key = ?'
+                ' AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now),
+            ).rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)', (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._transaction() as db:
+            db.executemany(
+                'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+            )
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок процесса, как и у LocMemCache.
+        pass
+
+    def _cull(self, db, now):
+        if next(self._writes) % self._cull_every:
+            return
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache')
+            return
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (count // self._cull_frequency,),
+        )
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT: запись не пересекается с другими."""
+
+    def __init__(self, db, begin):
+        self.db = db
+        self.begin = begin
+
+    def __enter__(self):
+        self.db.execute(self.begin)
+        return self.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+PAGE = 10
+
+
+def make_backends(directory, max_entries):
+    params = {'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    return {
+        'locmem': LocMemCache('bench', params),
+        'filebased': FileBasedCache(
+            os.path.join(directory, 'files'), params
+        ),
+        'sqlite': SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), params
+        ),
+    }
+
+
+def run_operations(cache, keys, value):
+    """Возвращает время в секундах для каждой операции."""
+    timings = {}
+    start = time.perf_counter()
+    for key in keys:
+        cache.set(key, value)
+    timings['set'] = time.perf_counter() - start
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    timings['get'] = time.perf_counter() - start
+    start = time.perf_counter()
+    for first in range(0, len(keys), PAGE):
+        cache.set_many({key: value for key in keys[first:first + PAGE]})
+    timings['set_many'] = time.perf_counter() - start
+    start = time.perf_counter()
+    for first in range(0, len(keys), PAGE):
+        cache.get_many(keys[first:first + PAGE])
+    timings['get_many'] = time.perf_counter() - start
+    return timings
+
+
+def shared_hits(directory, name, max_entries, keys):
+    """Сколько ключей, записанных родителем, видит другой процесс."""
+    cache = make_backends(directory, max_entries)[name]
+    return len(cache.get_many(keys))
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает SQLiteCache с LocMemCache и FileBasedCache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--value-size', type=int, default=2048)
+
+    def handle(self, *args, **options):
+        keys = [f'bench:{number}' for number in range(options['keys'])]
+        value = 'x' * options['value_size']
+        max_entries = len(keys) * 2
+        with tempfile.TemporaryDirectory() as directory:
+            backends = make_backends(directory, max_entries)
+            self.stdout.write(
+                f'{"backend":<10}{"set":>10}{"get":>10}'
+                f'{"set_many":>10}{"get_many":>10}{"shared":>8}'
+            )
+            for name, cache in backends.items():
+                cache.clear()
+                timings = run_operations(cache, keys, value)
+                with ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context('spawn'),
+                ) as pool:
+                    hits = pool.submit(
+                        shared_hits, directory, name, max_entries, keys
+                    ).result()
+                rates = ''.join(
+                    f'{len(keys) / seconds:>10.0f}'
+                    for seconds in timings.values()
+                )
+                self.stdout.write(
+                    f'{name:<10}{rates}{hits * 100 // len(keys):>7}%'
+                )
+        self.stdout.write(
+            'Операций в секунду; shared — доля ключей, видимых из '
+            'другого процесса.'
+        )
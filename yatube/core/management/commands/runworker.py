@@ -0,0 +1,74 @@
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.tasks import claim_task, run_task
+
+
+class Command(BaseCommand):
+    help = 'Выполняет отложенные задачи из очереди core_task'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Сколько задач выполнять одновременно',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти',
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        if not options['once']:
+            signal.signal(signal.SIGTERM, lambda *args: self.stop.set())
+            signal.signal(signal.SIGINT, lambda *args: self.stop.set())
+            self.stdout.write(
+                f'Воркер запущен, потоков: {options["threads"]}'
+            )
+        if options['threads'] == 1:
+            results = [self.work(options['poll'], options['once'])]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=options['threads'], thread_name_prefix='worker'
+            ) as pool:
+                futures = [
+                    pool.submit(self.work_in_thread, options['poll'],
+                                options['once'])
+                    for _ in range(options['threads'])
+                ]
+            results = [future.result() for future in futures]
+        done = sum(succeeded for succeeded, _ in results)
+        failed = sum(errors for _, errors in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {done}, с ошибкой: {failed}'
+        ))
+
+    def work(self, poll, once):
+        """Цикл одного потока; при остановке текущая задача доделывается."""
+        done = failed = 0
+        while not self.stop.is_set():
+            task = claim_task()
+            if task is None:
+                if once:
+                    break
+                self.stop.wait(poll)
+                continue
+            if run_task(task):
+                done += 1
+            else:
+                failed += 1
+        return done, failed
+
+    def work_in_thread(self, poll, once):
+        try:
+            return self.work(poll, once)
+        finally:
+            connection.close()
@@ -0,0 +1,172 @@
+"""Менеджер, который читает объекты через core.tiered.
+
+Model.cached.get(pk=...) и get(<поле из lookups>=...) сначала смотрят в
+кэш, а get_many(pks) добирает из базы одним запросом только промахи.
+В кэше лежит не pickle объекта, а кортеж значений полей в порядке
+field_names, и объект собирается заново через from_db. Отсутствующий
+объект тоже кэшируется, как None, чтобы частые 404 не ходили в базу.
+
+Сохранение и удаление через модель сбрасывают кэш сами. update() на
+queryset сигналов не шлёт, поэтому после него нужен forget(pks).
+"""
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.http import Http404
+
+from .tiered import tiered_cache
+
+
+def forget_keys(keys):
+    """Удаляет ключи сразу и ещё раз после коммита транзакции.
+
+    Иначе другой процесс успел бы до коммита положить в кэш старое.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+
+    def forget():
+        tiered_cache.delete(*keys)
+    forget()
+    transaction.on_commit(forget)
+
+
+class CachedManager:
+    """Не models.Manager: иначе он стал бы менеджером по умолчанию у
+    User, добавленный через add_to_class. Запросы идут через
+    _default_manager модели."""
+
+    def __init__(self, lookups=(), fields=None):
+        """lookups — уникальные поля для get, кроме pk; fields — какие
+        поля хранить, по умолчанию все. Остальные будут отложенными."""
+        self.lookups = lookups
+        self.fields = fields
+
+    def contribute_to_class(self, model, name):
+        self.model = model
+        setattr(model, name, self)
+        uid = f'{model._meta.label_lower}.{name}'
+        pre_save.connect(self.remember, model, weak=False, dispatch_uid=uid)
+        post_save.connect(self.forget_instance, model, weak=False,
+                          dispatch_uid=uid)
+        post_delete.connect(self.forget_instance, model, weak=False,
+                            dispatch_uid=uid)
+
+    @property
+    def field_names(self):
+        return [
+            field.attname for field in self.model._meta.concrete_fields
+            if self.fields is None or field.primary_key
+            or field.name in self.fields
+        ]
+
+    def key(self, field, value):
+        value = hashlib.md5(str(value).encode()).hexdigest()
+        return f'{self.model._meta.label_lower}:{field.name}:{value}'
+
+    def lookup_field(self, lookup):
+        if lookup in ('pk', self.model._meta.pk.name):
+            return self.model._meta.pk
+        if lookup in self.lookups:
+            return self.model._meta.get_field(lookup)
+        return None
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def build(self, row):
+        return self.model.from_db(
+            self.get_queryset().db, self.field_names, row
+        )
+
+    def fetch(self, field, value):
+        return self.get_queryset().filter(
+            **{field.name: value}
+        ).values_list(*self.field_names).first()
+
+    def get(self, *args, **kwargs):
+        field = len(kwargs) == 1 and self.lookup_field(next(iter(kwargs)))
+        if args or not field:
+            return self.get_queryset().get(*args, **kwargs)
+        value = field.to_python(next(iter(kwargs.values())))
+        row = tiered_cache.get_or_set(
+            self.key(field, value),
+            lambda: self.fetch(field, value),
+            settings.TIERED_CACHE_TIMEOUT,
+        )
+        if row is None:
+            raise self.model.DoesNotExist(
+                f'{self.model._meta.object_name} matching query does not '
+                f'exist.'
+            )
+        return self.build(row)
+
+    def get_many(self, pks):
+        """{pk: объект} в порядке pks; ненайденных в словаре нет."""
+        pk = self.model._meta.pk
+        pks = [pk.to_python(value) for value in pks]
+        keys = {value: self.key(pk, value) for value in pks}
+        cached = tiered_cache.get_many(list(keys.values()))
+        missing = [value for value in pks if keys[value] not in cached]
+        rows = {value: cached[keys[value]] for value in pks
+                if keys[value] in cached}
+        if missing:
+            index = self.field_names.index(pk.attname)
+            fetched = {
+                row[index]: row
+                for row in self.get_queryset().filter(
+                    pk__in=missing
+                ).values_list(*self.field_names)
+            }
+            tiered_cache.set_many(
+                {keys[value]: fetched.get(value) for value in missing},
+                settings.TIERED_CACHE_TIMEOUT,
+            )
+            rows.update((value, fetched.get(value)) for value in missing)
+        return {
+            value: self.build(rows[value])
+            for value in pks if rows[value] is not None
+        }
+
+    def forget(self, pks):
+        """Сбрасывает объекты по pk, например после update()."""
+        pk = self.model._meta.pk
+        forget_keys([self.key(pk, pk.to_python(value)) for value in pks])
+
+    def touches_cache(self, update_fields):
+        names = self.fields or [f.name for f in self.model._meta.fields]
+        return not update_fields or bool(set(names) & set(update_fields))
+
+    def remember(self, sender, instance, update_fields=None, **kwargs):
+        """Запоминает прежние значения lookups: они могут смениться."""
+        instance._cached_lookups = None
+        if (self.lookups and instance.pk
+                and self.touches_cache(update_fields)):
+            instance._cached_lookups = self.get_queryset().filter(
+                pk=instance.pk
+            ).values_list(*self.lookups).first()
+
+    def forget_instance(self, sender, instance, update_fields=None,
+                        **kwargs):
+        if not self.touches_cache(update_fields):
+            return
+        pk = self.model._meta.pk
+        keys = {self.key(pk, pk.to_python(instance.pk))}
+        old = getattr(instance, '_cached_lookups', None) or ()
+        for name, old_value in zip(self.lookups, old):
+            keys.add(self.key(self.model._meta.get_field(name), old_value))
+        for name in self.lookups:
+            field = self.model._meta.get_field(name)
+            keys.add(self.key(field, getattr(instance, field.attname)))
+        forget_keys(keys)
+
+
+def get_cached_or_404(manager, **kwargs):
+    """get_object_or_404 берёт у менеджера queryset и обходит кэш."""
+    try:
+        return manager.get(**kwargs)
+    except manager.model.DoesNotExist:
+        raise Http404
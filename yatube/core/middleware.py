@@ -0,0 +1,86 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.queries')
+
+
+def query_budget(limit):
+    """Объявляет, сколько SQL-запросов может сделать view за один запрос."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def get_query_budget(view):
+    view_class = getattr(view, 'view_class', None)
+    return getattr(
+        view, 'query_budget', getattr(view_class, 'query_budget', None)
+    )
+
+
+class QueryStats:
+    """Считает запросы к базе, их общее время и самый медленный из них."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, '')
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration > self.slowest[0]:
+                self.slowest = (duration, sql)
+
+
+def is_internal(request):
+    return (
+        settings.DEBUG
+        or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+    )
+
+
+class QueryStatsMiddleware:
+    """Строка лога на каждый запрос и заголовки X-DB-Queries/X-DB-Time.
+
+    Заголовки видны только при DEBUG и с адресов из INTERNAL_IPS: число
+    и время запросов снаружи показывать незачем.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request.query_budget = None
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        budget = request.query_budget
+        if is_internal(request):
+            response['X-DB-Queries'] = stats.count
+            response['X-DB-Time'] = f'{stats.duration * 1000:.1f}'
+            if budget is not None:
+                response['X-DB-Budget'] = budget
+        over_budget = budget is not None and stats.count > budget
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            '%s %s: %d queries (budget %s), %.1f ms, slowest %.1f ms: %s',
+            request.method, request.path, stats.count, budget,
+            stats.duration * 1000, stats.slowest[0] * 1000, stats.slowest[1],
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(view_func)
@@ -0,0 +1,57 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DEAD, 'Не выполнена'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    args = models.TextField('Аргументы в JSON', default='[]')
+    status = models.CharField(
+        'Состояние',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField('Максимум попыток', default=5)
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        ordering = ('run_at', 'id')
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='task_status_run_at_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class DeadTaskManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(status=Task.DEAD)
+
+
+class DeadTask(Task):
+    """Задачи, исчерпавшие попытки, — отдельный раздел в админке."""
+
+    objects = DeadTaskManager()
+
+    class Meta:
+        proxy = True
+        verbose_name = 'Неудавшаяся задача'
+        verbose_name_plural = 'Неудавшиеся задачи'
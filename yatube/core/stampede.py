@@ -0,0 +1,74 @@
+"""Защита горячих ключей кэша от одновременного пересчёта.
+
+Запись хранится как Entry(value, expires, delta): delta — сколько
+секунд занял расчёт. Ключ живёт в кэше вдвое дольше timeout, так что
+после логического истечения остаётся старое значение.
+
+Пересчёт начинается заранее с вероятностью, которая растёт к концу
+срока и с долгим расчётом (XFetch: now - delta * beta * ln(rand) >=
+expires), поэтому запросы не упираются в истечение все разом. Кто
+взял блокировку, тот и пересчитывает; остальные в это время отдают
+старое значение, а если его нет, недолго ждут нового.
+"""
+import math
+import random
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+
+Entry = namedtuple('Entry', 'value expires delta')
+
+# Дольше этого расчёт не держит блокировку, даже если процесс упал.
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 5
+WAIT_POLL = 0.05
+
+
+def is_due(entry, beta=1.0):
+    """Пора ли пересчитать: срок вышел или выпал ранний пересчёт."""
+    early = entry.delta * beta * -math.log(1 - random.random())
+    return time.time() + early >= entry.expires
+
+
+def acquire(key):
+    """Берёт блокировку пересчёта ключа: токен или None, если её держит
+    другой."""
+    token = uuid.uuid4().hex
+    return token if cache.add(f'{key}:lock', token, LOCK_TIMEOUT) else None
+
+
+def release(key, token):
+    """Снимает только свою блокировку.
+
+    Если расчёт шёл дольше LOCK_TIMEOUT, блокировку мог уже взять другой
+    процесс, и её удаление снова пустило бы пересчитывать всех.
+    """
+    lock = f'{key}:lock'
+    if cache.get(lock) == token:
+        cache.delete(lock)
+
+
+def store(key, value, timeout, started):
+    """Сохраняет результат расчёта, начатого в started (time.time())."""
+    now = time.time()
+    cache.set(key, Entry(value, now + timeout, now - started), timeout * 2)
+
+
+def wait(key):
+    """Ждёт, пока значение положит тот, кто держит блокировку.
+
+    None, если блокировку отпустили без записи или ожидание вышло:
+    тогда считать придётся самому.
+    """
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_POLL)
+        found = cache.get_many([key, lock])
+        if key in found:
+            return found[key]
+        if lock not in found:
+            return None
+    return None
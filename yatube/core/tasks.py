@@ -0,0 +1,114 @@
+"""Отложенные задачи в таблице core_task.
+
+Функция с декоратором @task ставится в очередь через .delay(*args), а
+выполняет её manage.py runworker; .delay(*args, countdown=n) — не
+раньше чем через n секунд. Очередь лежит в той же базе, что и
+данные, поэтому задача, поставленная внутри транзакции, станет видна
+воркеру только после коммита. Аргументы должны сериализоваться в JSON.
+При TASKS_EAGER задача выполняется сразу, без очереди.
+"""
+import json
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Первая повторная попытка через RETRY_DELAY секунд, дальше вдвое дольше.
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 3600
+# Задача в RUNNING дольше LEASE секунд считается брошенной упавшим
+# воркером и снова выдаётся.
+LEASE = 300
+
+
+def task(max_attempts=5):
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        def delay(*args, countdown=0):
+            if settings.TASKS_EAGER:
+                try:
+                    func(*args)
+                except Exception:
+                    logger.exception('Задача %s завершилась ошибкой', name)
+                return None
+            return Task.objects.create(
+                name=name,
+                args=json.dumps(args),
+                max_attempts=max_attempts,
+                run_at=timezone.now() + timedelta(seconds=countdown),
+            )
+
+        func.task_name = name
+        func.delay = delay
+        return func
+    return decorator
+
+
+def retry_delay(attempts):
+    seconds = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    return timedelta(seconds=seconds * random.uniform(1, 1.1))
+
+
+def claim_task():
+    """Забирает одну готовую задачу; воркеры не получат её дважды.
+
+    Захват — условный UPDATE по прочитанным status и run_at: если другой
+    воркер успел раньше, строка уже не совпадёт и обновится 0 строк.
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status__in=(Task.QUEUED, Task.RUNNING),
+        run_at__lte=now,
+    ).values_list('pk', 'status', 'run_at')[:10]
+    for pk, status, run_at in candidates:
+        claimed = Task.objects.filter(
+            pk=pk, status=status, run_at=run_at
+        ).update(
+            status=Task.RUNNING,
+            run_at=now + timedelta(seconds=LEASE),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def run_task(task):
+    """Выполняет задачу: удачная удаляется, упавшая ждёт повтора."""
+    try:
+        func = import_string(task.name)
+        if getattr(func, 'task_name', None) != task.name:
+            raise ImportError(f'{task.name} не помечена @task')
+        func(*json.loads(task.args))
+    except Exception:
+        fail_task(task, traceback.format_exc())
+        return False
+    task.delete()
+    return True
+
+
+def fail_task(task, error):
+    logger.warning('Задача %s (#%s) упала:\n%s', task.name, task.pk, error)
+    changes = {'status': Task.QUEUED, 'last_error': error}
+    if task.attempts >= task.max_attempts:
+        changes['status'] = Task.DEAD
+    else:
+        changes['run_at'] = timezone.now() + retry_delay(task.attempts)
+    Task.objects.filter(pk=task.pk).update(**changes)
+
+
+def retry_tasks(queryset):
+    """Возвращает задачи в очередь с новым запасом попыток."""
+    return queryset.update(
+        status=Task.QUEUED, attempts=0, run_at=timezone.now()
+    )
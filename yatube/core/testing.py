@@ -0,0 +1,61 @@
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def isolated_settings():
+    """Временная папка и override_settings с кэшем и MEDIA_ROOT в ней.
+
+    Общий кэш лежит в файле и виден всем процессам, поэтому тесты и
+    bench не должны писать в кэш и медиа запущенного сайта. Задачи
+    выполняются сразу, без runworker.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-')
+    caches = copy.deepcopy(settings.CACHES)
+    caches['default']['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+    return directory, override_settings(
+        CACHES=caches,
+        MEDIA_ROOT=os.path.join(directory, 'media'),
+        TASKS_EAGER=True,
+    )
+
+
+def clear_caches():
+    """Общий кэш и L1 этого процесса: L1 сам заметит сброс не сразу."""
+    from .tiered import tiered_cache
+
+    cache.clear()
+    tiered_cache.clear_local()
+
+
+class IsolatedTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.isolated_dir, self.isolated = isolated_settings()
+        self.isolated.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolated.disable()
+        shutil.rmtree(self.isolated_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета запросов, объявленного через @query_budget."""
+
+    def assertWithinQueryBudget(self, response):
+        budget = response.get('X-DB-Budget')
+        self.assertIsNotNone(
+            budget, f'{response.wsgi_request.path}: бюджет не объявлен'
+        )
+        self.assertLessEqual(
+            int(response['X-DB-Queries']),
+            int(budget),
+            f'{response.wsgi_request.path}: запросов больше бюджета',
+        )
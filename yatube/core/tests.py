@@ -1,6 +1,36 @@
+import os
+import re
+import tempfile
+import time
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.cache import SQLiteCache
+from core import stampede, tiered
+from core.models import DeadTask, Task
+from core.tasks import claim_task, task
+from posts.models import Follow, Post, User
+
+calls = []
+
+
+@task()
+def remember(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError('Ошибка задачи')
 
 
 class ViewTestClass(TestCase):
@@ -9,3 +39,269 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(
+            self.location,
+            {'OPTIONS': {
+                'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2, 'CULL_EVERY': 1,
+            }},
+        )
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому с тем же файлом."""
+        other = SQLiteCache(self.location, {})
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(other.get_many(['a', 'b', 'c']), {'a': 1, 'b': [2]})
+        other.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_add_incr_and_expiry(self):
+        """add не перезаписывает живой ключ, истёкший ключ не читается."""
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.incr('key', 5), 6)
+        self.cache.set('old', 'value', timeout=-1)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertTrue(self.cache.add('old', 'new'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные ключи."""
+        self.cache.lru_resolution = -1
+        for number in range(4):
+            self.cache.set(number, number)
+        self.cache.get(0)
+        self.cache.set(4, 4)
+        self.assertEqual(
+            sorted(self.cache.get_many(range(5))), [0, 3, 4]
+        )
+
+    def test_size_is_checked_every_n_writes(self):
+        sparse = SQLiteCache(self.location, {'OPTIONS': {
+            'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2, 'CULL_EVERY': 10,
+        }})
+        for number in range(6):
+            sparse.set(number, number)
+        self.assertEqual(len(sparse.get_many(range(6))), 6)
+        for number in range(6, 10):
+            sparse.set(number, number)
+        sparse.set(10, 10)
+        self.assertEqual(len(sparse.get_many(range(11))), 6)
+
+
+class StampedeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_early_recompute_is_probabilistic(self):
+        """Чем ближе срок и дольше расчёт, тем вероятнее пересчёт."""
+        entry = stampede.Entry('старое', time.time() + 10, 1.0)
+        with mock.patch('random.random', return_value=0.5):
+            self.assertFalse(stampede.is_due(entry))
+        with mock.patch('random.random', return_value=0.99999999):
+            self.assertTrue(stampede.is_due(entry))
+
+    def test_lock_is_taken_once(self):
+        token = stampede.acquire('key')
+        self.assertTrue(token)
+        self.assertIsNone(stampede.acquire('key'))
+        stampede.release('key', token)
+        self.assertTrue(stampede.acquire('key'))
+
+    def test_expired_lock_is_not_released_by_old_owner(self):
+        """Долгий расчёт не снимает блокировку, взятую после него."""
+        old = stampede.acquire('key')
+        cache.delete('key:lock')
+        new = stampede.acquire('key')
+        stampede.release('key', old)
+        self.assertIsNone(stampede.acquire('key'))
+        stampede.release('key', new)
+        self.assertTrue(stampede.acquire('key'))
+
+    def test_wait_returns_value_of_other(self):
+        self.assertTrue(stampede.acquire('key'))
+
+        def other_finishes(seconds):
+            stampede.store('key', 'от другого', 60, time.time())
+
+        with mock.patch('time.sleep', side_effect=other_finishes):
+            entry = stampede.wait('key')
+        self.assertEqual(entry.value, 'от другого')
+
+    def test_wait_stops_when_lock_is_released(self):
+        """Другой отпустил блокировку без записи: ждать нечего."""
+        token = stampede.acquire('key')
+        sleep = mock.Mock(
+            side_effect=lambda seconds: stampede.release('key', token)
+        )
+        with mock.patch('time.sleep', sleep):
+            self.assertIsNone(stampede.wait('key'))
+        sleep.assert_called_once()
+
+
+@override_settings(TIERED_CACHE_SIZE=2, TIERED_CACHE_CHECK_INTERVAL=0)
+class TieredCacheTest(TestCase):
+    """Два экземпляра TieredCache изображают два процесса."""
+
+    def setUp(self):
+        cache.clear()
+        self.first = tiered.TieredCache()
+        self.second = tiered.TieredCache()
+
+    def test_l1_serves_without_l2(self):
+        self.first.set('key', ['значение'], 60)
+        cache.delete(self.first.l2_key('key'))
+        value = self.first.get('key')
+        self.assertEqual(value, ['значение'])
+        value.append('изменено')
+        self.assertEqual(self.first.get('key'), ['значение'])
+        stats = self.first.stats()
+        self.assertEqual(stats['l1']['hits'], 2)
+        self.assertIsNone(stats['l2']['hit_rate'])
+
+    def test_second_process_reads_l2_once(self):
+        self.first.set('key', 'значение', 60)
+        self.assertEqual(self.second.get('key'), 'значение')
+        self.assertEqual(self.second.get('key'), 'значение')
+        self.assertEqual(self.second.stats(), {
+            'l1': {'hits': 1, 'misses': 1, 'hit_rate': 0.5},
+            'l2': {'hits': 1, 'misses': 0, 'hit_rate': 1.0},
+        })
+
+    def test_delete_reaches_other_process(self):
+        self.first.set('key', 'старое', 60)
+        self.second.get('key')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+        self.first.set('key', 'новое', 60)
+        self.assertEqual(self.second.get('key'), 'новое')
+
+    def test_lost_message_clears_l1(self):
+        self.first.set('key', 'значение', 60)
+        self.first.set('other', 'другое', 60)
+        self.second.get('key')
+        self.second.get('other')
+        self.first.delete('key')
+        cache.delete_many(
+            key for key in cache.get_many(
+                [f'tiered:message:{n}' for n in range(1, 5)]
+            )
+        )
+        self.assertEqual(self.second.get('other'), 'другое')
+        self.assertEqual(self.second.stats()['l2']['hits'], 3)
+
+    def test_evicted_generation_is_started_again(self):
+        """Вытесненный счётчик не роняет удаление, а L1 других чистится."""
+        self.first.set('key', 'старое', 60)
+        self.first.delete('other')
+        self.second.get('key')
+        cache.delete(tiered.GENERATION_KEY)
+        self.first.delete('key')
+        self.assertEqual(cache.get(tiered.GENERATION_KEY), 1)
+        self.assertIsNone(self.second.get('key'))
+
+    def test_l1_is_bounded(self):
+        for key in ('first', 'second', 'third'):
+            self.first.set(key, key, 60)
+        self.assertEqual(list(self.first.local), ['second', 'third'])
+
+    @override_settings(TIERED_CACHE_CHECK_INTERVAL=60)
+    def test_other_process_checks_messages_by_interval(self):
+        self.first.set('key', 'старое', 60)
+        self.second.get('key')
+        self.first.delete('key')
+        self.assertEqual(self.second.get('key'), 'старое')
+        self.second.checked = 0
+        self.assertIsNone(self.second.get('key'))
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def run_worker(self):
+        call_command('runworker', once=True, threads=1, stdout=StringIO())
+
+    def test_delay_queues_and_worker_runs(self):
+        """Задача ждёт в очереди, воркер выполняет и удаляет её."""
+        remember.delay('значение')
+        self.assertEqual(calls, [])
+        self.assertEqual(Task.objects.get().name, 'core.tests.remember')
+        self.run_worker()
+        self.assertEqual(calls, ['значение'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_retry_with_backoff_then_dead(self):
+        """Упавшая задача откладывается, а после всех попыток — в DeadTask."""
+        explode.delay()
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.run_worker()
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.QUEUED)
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertIn('Ошибка задачи', failed.last_error)
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.run_worker()
+        self.assertEqual(DeadTask.objects.get().attempts, 2)
+
+    def test_countdown_postpones_task(self):
+        remember.delay(1, countdown=60)
+        self.run_worker()
+        self.assertEqual(calls, [])
+        Task.objects.update(run_at=timezone.now())
+        self.run_worker()
+        self.assertEqual(calls, [1])
+
+    def test_abandoned_task_is_claimed_again(self):
+        remember.delay(1)
+        claimed = claim_task()
+        self.assertEqual(claimed.status, Task.RUNNING)
+        self.assertIsNone(claim_task())
+        Task.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_task().pk, claimed.pk)
+
+    def test_unmarked_function_is_not_run(self):
+        Task.objects.create(name='os.remove', args='["/tmp/x"]')
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.run_worker()
+        self.assertIn('не помечена @task', Task.objects.get().last_error)
+
+    def test_post_fan_out_and_email_are_queued(self):
+        """Ленты подписчиков и письмо сброса пароля уходят воркеру."""
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(author=author, text='Пост')
+        self.client.post(
+            reverse('users:password_reset'), {'email': reader.email}
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(reader.timeline.exists())
+        self.assertFalse(
+            Task.objects.filter(args__contains='/reset/').exists()
+        )
+        self.run_worker()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [reader.email])
+        uid, token = re.search(
+            r'/auth/reset/([^/\s]+)/([^/\s]+)/', mail.outbox[0].body
+        ).groups()
+        self.assertRedirects(
+            self.client.get(f'/auth/reset/{uid}/{token}/'),
+            f'/auth/reset/{uid}/set-password/',
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(
+            list(reader.timeline.values_list('post', flat=True)), [post.pk]
+        )
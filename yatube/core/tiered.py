@@ -0,0 +1,203 @@
+"""Двухуровневый кэш для мелких горячих объектов.
+
+L1 — LRU на TIERED_CACHE_SIZE записей в памяти процесса, L2 — общий
+CACHES['default']. Чтение из L1 не ходит в кэш вовсе; в L1 лежит
+pickle значения, так что каждый get возвращает свою копию и её можно
+менять. В L2 значение хранится вместе со сроком, и L1 держит его до
+того же срока.
+
+Удаление ключа — сообщение остальным процессам: счётчик поколений в L2
+увеличивается, а под новым номером записывается список удалённых
+ключей. Каждый процесс не чаще раза в TIERED_CACHE_CHECK_INTERVAL
+секунд читает счётчик и выбрасывает из L1 ключи из пропущенных
+сообщений. Если сообщения уже вытеснены или счётчик начался заново,
+L1 очищается целиком. Поэтому другой воркер может видеть старое
+значение не дольше этого интервала.
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+PREFIX = 'tiered'
+GENERATION_KEY = f'{PREFIX}:generation'
+EPOCH_KEY = f'{PREFIX}:epoch'
+# Сообщения хранятся недолго: процесс, отставший больше чем на
+# MAX_MESSAGES поколений, просто очищает L1.
+MAX_MESSAGES = 100
+MESSAGE_TIMEOUT = 600
+
+MISSING = object()
+
+
+class TieredCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = OrderedDict()
+        self.counts = Counter()
+        self.seen = self.epoch = None
+        self.checked = 0.0
+
+    def l2_key(self, key):
+        return f'{PREFIX}:{key}'
+
+    def get(self, key, default=None):
+        self.sync()
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None and entry[1] > time.time():
+                self.local.move_to_end(key)
+                self.counts['l1_hits'] += 1
+                return pickle.loads(entry[0])
+            self.counts['l1_misses'] += 1
+        entry = cache.get(self.l2_key(key))
+        if entry is None:
+            self.counts['l2_misses'] += 1
+            return default
+        self.counts['l2_hits'] += 1
+        value, expires = entry
+        self.remember(key, value, expires)
+        return value
+
+    def set(self, key, value, timeout):
+        expires = time.time() + timeout
+        cache.set(self.l2_key(key), (value, expires), timeout)
+        self.remember(key, value, expires)
+
+    def get_many(self, keys):
+        """{key: value} для найденных ключей; L2 читается одним запросом."""
+        self.sync()
+        found = {}
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                entry = self.local.get(key)
+                if entry is not None and entry[1] > now:
+                    self.local.move_to_end(key)
+                    found[key] = pickle.loads(entry[0])
+            self.counts['l1_hits'] += len(found)
+            self.counts['l1_misses'] += len(keys) - len(found)
+        rest = {self.l2_key(key): key for key in keys if key not in found}
+        if not rest:
+            return found
+        entries = cache.get_many(rest)
+        self.counts['l2_hits'] += len(entries)
+        self.counts['l2_misses'] += len(rest) - len(entries)
+        for l2_key, (value, expires) in entries.items():
+            self.remember(rest[l2_key], value, expires)
+            found[rest[l2_key]] = value
+        return found
+
+    def set_many(self, data, timeout):
+        expires = time.time() + timeout
+        cache.set_many({
+            self.l2_key(key): (value, expires)
+            for key, value in data.items()
+        }, timeout)
+        for key, value in data.items():
+            self.remember(key, value, expires)
+
+    def get_or_set(self, key, compute, timeout):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = compute()
+            self.set(key, value, timeout)
+        return value
+
+    def delete(self, *keys):
+        """Удаляет ключи здесь, в L2 и, через сообщение, в других L1."""
+        cache.delete_many([self.l2_key(key) for key in keys])
+        with self.lock:
+            for key in keys:
+                self.local.pop(key, None)
+        generation = self.next_generation()
+        cache.set(f'{PREFIX}:message:{generation}', keys, MESSAGE_TIMEOUT)
+
+    def next_generation(self):
+        """Номер нового сообщения.
+
+        Счётчика может не быть: его ещё не завели или вытеснили из L2.
+        Тогда он начинается заново с новой эпохой, и остальные процессы
+        очистят L1 целиком.
+        """
+        try:
+            return cache.incr(GENERATION_KEY)
+        except ValueError:
+            pass
+        if not cache.add(GENERATION_KEY, 1, None):
+            # Счётчик успел завести другой процесс.
+            try:
+                return cache.incr(GENERATION_KEY)
+            except ValueError:
+                cache.set(GENERATION_KEY, 1, None)
+        cache.set(EPOCH_KEY, uuid.uuid4().hex, None)
+        return 1
+
+    def remember(self, key, value, expires):
+        """Кладёт значение в L1 до того же срока, что и в L2."""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.local[key] = (data, expires)
+            self.local.move_to_end(key)
+            while len(self.local) > settings.TIERED_CACHE_SIZE:
+                self.local.popitem(last=False)
+
+    def sync(self):
+        """Применяет сообщения об удалении, пришедшие от других процессов."""
+        now = time.monotonic()
+        if now - self.checked < settings.TIERED_CACHE_CHECK_INTERVAL:
+            return
+        self.checked = now
+        state = cache.get_many([GENERATION_KEY, EPOCH_KEY])
+        generation = state.get(GENERATION_KEY, 0)
+        seen, self.seen = self.seen, generation
+        epoch, self.epoch = self.epoch, state.get(EPOCH_KEY)
+        if seen is None:
+            # Первая проверка: в L1 только то, что процесс сам положил.
+            return
+        if epoch != self.epoch or generation < seen:
+            self.clear_local()
+            return
+        if generation == seen:
+            return
+        if generation - seen > MAX_MESSAGES:
+            self.clear_local()
+            return
+        names = [
+            f'{PREFIX}:message:{number}'
+            for number in range(seen + 1, generation + 1)
+        ]
+        messages = cache.get_many(names)
+        if len(messages) < len(names):
+            self.clear_local()
+            return
+        with self.lock:
+            for keys in messages.values():
+                for key in keys:
+                    self.local.pop(key, None)
+
+    def clear_local(self):
+        with self.lock:
+            self.local.clear()
+
+    def stats(self):
+        """Попадания по уровням с запуска процесса."""
+        with self.lock:
+            counts = dict(self.counts)
+        result = {}
+        for tier in ('l1', 'l2'):
+            hits = counts.get(f'{tier}_hits', 0)
+            total = hits + counts.get(f'{tier}_misses', 0)
+            result[tier] = {
+                'hits': hits,
+                'misses': total - hits,
+                'hit_rate': round(hits / total, 3) if total else None,
+            }
+        return result
+
+
+tiered_cache = TieredCache()
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Comment, Follow, Group, Post
+from .models import AuthorStats, Comment, Follow, Group, Like, Post, Tag
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -36,7 +36,30 @@ class FollowAdmin(admin.ModelAdmin):
     )
 
 
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'posts_count',
+        'follows_count',
+        'followers_count',
+        'comments_count',
+    )
+
+
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
+
+class LikeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'post', 'created')
+    raw_id_fields = ('user', 'post')
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(AuthorStats, AuthorStatsAdmin)
+admin.site.register(Tag, TagAdmin)
+admin.site.register(Like, LikeAdmin)
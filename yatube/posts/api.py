@@ -0,0 +1,96 @@
+"""JSON-версии лент и поста только для чтения.
+
+Ответ не рендерит шаблонов, а повторный опрос с If-None-Match стоит
+одного чтения версии из кэша.
+"""
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import urlencode
+
+from core.middleware import query_budget
+
+from .models import Group, Post, User
+from .utils import (author_scopes, get_comments_page, get_cursor_page,
+                    group_scopes, index_scopes, post_scopes, versioned)
+
+POST_FIELDS = (
+    'text', 'pub_date', 'image', 'author', 'author__username',
+    'group', 'group__slug', 'group__title', 'likes_count',
+)
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'author': post.author.username,
+        'group': post.group and {
+            'slug': post.group.slug,
+            'title': post.group.title,
+        },
+        'image': post.image.url if post.image else None,
+        'likes': post.likes_count,
+    }
+
+
+def page_link(request, name, cursor):
+    return cursor and f'{request.path}?{urlencode({name: cursor})}'
+
+
+def feed_response(request, post_list):
+    page = get_cursor_page(
+        post_list.select_related('author', 'group').only(*POST_FIELDS),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return JsonResponse({
+        'results': [serialize_post(post) for post in page],
+        'next': page_link(request, 'after', page.next_cursor),
+        'previous': page_link(request, 'before', page.previous_cursor),
+    })
+
+
+@query_budget(1)
+@versioned(index_scopes)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@query_budget(3)
+@versioned(group_scopes)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, group.posts.all())
+
+
+@query_budget(3)
+@versioned(author_scopes)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(request, author.posts.all())
+
+
+@query_budget(2)
+@versioned(post_scopes)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group').only(*POST_FIELDS),
+        pk=post_id,
+    )
+    data = serialize_post(post)
+    # Комментарии идут страницами, как в HTML: ?after= из comments_next.
+    comments = get_comments_page(post, request.GET.get('after'))
+    data['comments'] = [
+        {
+            'id': comment.pk,
+            'text': comment.text,
+            'created': comment.created,
+            'author': comment.author.username,
+        }
+        for comment in comments
+    ]
+    data['comments_next'] = page_link(
+        request, 'after', comments.next_cursor
+    )
+    return JsonResponse(data)
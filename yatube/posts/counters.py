@@ -0,0 +1,216 @@
+"""Счётчик просмотров постов с отложенной записью.
+
+UPDATE posts_post на каждый просмотр брал бы блокировку записи SQLite
+в каждом запросе. Поэтому просмотры копятся в буфере и пишутся одним
+UPDATE ... CASE раз в VIEWS_FLUSH_INTERVAL секунд или каждые
+VIEWS_FLUSH_HITS просмотров.
+
+VIEWS_BUFFER = 'memory' — буфер в памяти процесса. Перед записью он
+забирается целиком, так что одни и те же просмотры не запишутся дважды.
+Таймера нет: буфер пишется на следующем просмотре, так что на
+простаивающем воркере он ждёт. При штатной остановке воркер дописывает
+буфер через atexit, а при падении недописанное теряется.
+
+VIEWS_BUFFER = 'cache' (по умолчанию) — общий буфер в кэше, разбитый по
+эпохам длиной VIEWS_FLUSH_INTERVAL. Первый просмотр эпохи ставит в
+очередь runworker задачу flush_cache_views, которая запишет эпоху, когда
+та закроется, даже если просмотров больше не будет; то же делает
+manage.py flush_views по cron. Строка ViewFlush с номером эпохи
+создаётся в той же транзакции, что и UPDATE, поэтому эпоха не запишется
+второй раз, даже если воркер упал после коммита и не успел очистить кэш.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from core.tasks import task
+
+from .models import Post, ViewFlush
+from .utils import increment_counts
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'posts:views'
+# Запросы manage.py warm_cache просмотрами не считаются. В заголовке
+# подпись от SECRET_KEY: иначе любой клиент мог бы не оставлять
+# просмотров.
+WARMING_HEADER = 'HTTP_X_CACHE_WARMING'
+WARMING_SALT = 'posts.counters.warming'
+# Столько эпох буфер живёт в кэше; закрытые эпохи старше этого
+# уже вытеснены, и их номера в ViewFlush больше не нужны.
+KEEP_EPOCHS = 10
+
+
+def write_views(counts):
+    """Прибавляет просмотры {post_id: n} одним UPDATE."""
+    increment_counts(Post.objects, 'views_count', counts)
+    Post.cached.forget(counts)
+
+
+class MemoryBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.started = time.monotonic()
+        self.database = None
+
+    def add(self, post_id):
+        with self.lock:
+            if not self.counts:
+                self.database = connection.settings_dict['NAME']
+            self.counts[post_id] += 1
+            due = (
+                sum(self.counts.values()) >= settings.VIEWS_FLUSH_HITS
+                or time.monotonic() - self.started
+                >= settings.VIEWS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Пишет накопленное; при ошибке базы просмотры ждут следующей."""
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.started = time.monotonic()
+        if counts and self.database != connection.settings_dict['NAME']:
+            # Тесты и bench подменяют базу: просмотры из тестовой базы
+            # не должны попасть при выходе в настоящую.
+            return 0
+        try:
+            write_views(counts)
+        except DatabaseError:
+            logger.exception('Не удалось записать просмотры')
+            with self.lock:
+                self.counts.update(counts)
+            return 0
+        return len(counts)
+
+
+class CacheBuffer:
+    """Открытую эпоху записать нельзя, поэтому VIEWS_FLUSH_HITS не нужен.
+
+    Запрос только ставит задачу записи, сам он эпохи не пишет.
+    """
+
+    def epoch(self):
+        return int(time.time() // settings.VIEWS_FLUSH_INTERVAL)
+
+    def add(self, post_id):
+        epoch = self.epoch()
+        timeout = settings.VIEWS_FLUSH_INTERVAL * KEEP_EPOCHS
+        key = f'{PREFIX}:{epoch}:{post_id}'
+        try:
+            if cache.add(key, 1, timeout):
+                # Первый просмотр поста в эпохе: id попадает в список
+                # эпохи, чтобы при записи не перебирать все посты.
+                if cache.add(f'{PREFIX}:{epoch}:n', 0, timeout):
+                    # Эпоху запишут и без новых просмотров.
+                    flush_cache_views.delay(
+                        countdown=2 * settings.VIEWS_FLUSH_INTERVAL
+                    )
+                slot = cache.incr(f'{PREFIX}:{epoch}:n')
+                cache.set(f'{PREFIX}:{epoch}:id:{slot}', post_id, timeout)
+            else:
+                cache.incr(key)
+        except ValueError:
+            # Ключ вытеснили между add и incr: просмотр теряется.
+            pass
+
+    def read(self, epoch):
+        """Просмотры эпохи {post_id: n} и все её ключи в кэше."""
+        count = cache.get(f'{PREFIX}:{epoch}:n') or 0
+        slots = [f'{PREFIX}:{epoch}:id:{slot}' for slot in range(1, count + 1)]
+        post_ids = {
+            f'{PREFIX}:{epoch}:{post_id}': post_id
+            for post_id in cache.get_many(slots).values()
+        }
+        counts = {
+            post_ids[key]: delta
+            for key, delta in cache.get_many(post_ids).items()
+        }
+        return counts, [f'{PREFIX}:{epoch}:n', *slots, *post_ids]
+
+    def flush(self):
+        """Записывает закрытые эпохи, кроме последней.
+
+        Последняя закрытая эпоха ждёт ещё один интервал: запрос, который
+        начался до её конца, может дописывать её прямо сейчас.
+        """
+        current = self.epoch()
+        epochs = range(current - KEEP_EPOCHS, current - 1)
+        done = set(ViewFlush.objects.filter(
+            epoch__in=epochs
+        ).values_list('epoch', flat=True))
+        flushed = 0
+        for epoch in epochs:
+            if epoch in done:
+                continue
+            counts, keys = self.read(epoch)
+            if not counts:
+                continue
+            try:
+                with transaction.atomic():
+                    _, created = ViewFlush.objects.get_or_create(epoch=epoch)
+                    if created:
+                        write_views(counts)
+                        flushed += len(counts)
+            except DatabaseError:
+                logger.exception('Не удалось записать просмотры')
+                break
+            cache.delete_many(keys)
+        ViewFlush.objects.filter(epoch__lt=epochs.start).delete()
+        return flushed
+
+
+BUFFERS = {
+    'memory': MemoryBuffer(),
+    'cache': CacheBuffer(),
+}
+
+
+@task()
+def flush_cache_views():
+    BUFFERS['cache'].flush()
+
+
+def get_view_buffer():
+    return BUFFERS[settings.VIEWS_BUFFER]
+
+
+def record_view(post_id):
+    get_view_buffer().add(post_id)
+
+
+def warming_token():
+    return salted_hmac(WARMING_SALT, 'warm_cache').hexdigest()
+
+
+def is_warming(request):
+    token = request.META.get(WARMING_HEADER)
+    return token is not None and constant_time_compare(
+        token, warming_token()
+    )
+
+
+def count_view(view):
+    """Засчитывает просмотр и тогда, когда страница пришла из кэша или
+    ответом 304 — поэтому декоратор стоит снаружи кэширующих."""
+    @wraps(view)
+    def wrapper(request, post_id, *args, **kwargs):
+        response = view(request, post_id, *args, **kwargs)
+        if (response.status_code in (200, 304)
+                and not is_warming(request)):
+            record_view(post_id)
+        return response
+    return wrapper
+
+
+atexit.register(BUFFERS['memory'].flush)
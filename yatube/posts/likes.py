@@ -0,0 +1,140 @@
+"""Лайки постов и их счётчик без общей горячей строки.
+
+Лайк пишется строкой Like и прибавляется к одной из LIKE_SHARDS долей
+LikeCounter. Задача merge_likes раз в LIKES_MERGE_INTERVAL переносит
+доли в Post.likes_count, а карточки показывают уже перенесённое число:
+оно читается вместе с постом, без COUNT(*) на каждую карточку.
+
+Сам лайк не сбрасывает кэш общих страниц: это делает слияние. Своё
+«лайкнуто» читатель видит через liked_post_ids, а версия likes:<id>
+меняет только его ETag.
+"""
+import random
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Like, LikeCounter, Post
+from .utils import bump_listing_versions, increment_counts
+
+LIKE_SHARDS = 8
+
+
+def post_scopes(posts):
+    """Области кэша, где видны лайки постов (author_id, group_id)."""
+    scopes = {'index'}
+    for pk, author_id, group_id in posts:
+        scopes.update((f'post:{pk}', f'author:{author_id}'))
+        if group_id:
+            scopes.add(f'group:{group_id}')
+    return scopes
+
+
+def forget_posts(rows):
+    """Сбрасывает кэш постов (pk, author_id, group_id) и страниц с ними."""
+    rows = list(rows)
+    if not rows:
+        return
+    Post.cached.forget([pk for pk, _, _ in rows])
+    bump_listing_versions(*post_scopes(rows))
+
+
+def bump_shard(post_id, delta):
+    shard = random.randrange(LIKE_SHARDS)
+    counter = LikeCounter.objects.filter(post_id=post_id, shard=shard)
+    if not counter.update(count=F('count') + delta):
+        LikeCounter.objects.bulk_create(
+            [LikeCounter(post_id=post_id, shard=shard)],
+            ignore_conflicts=True,
+        )
+        counter.update(count=F('count') + delta)
+
+
+def add_like(user, post):
+    """Ставит лайк; False, если он уже стоял."""
+    with transaction.atomic():
+        _, created = Like.objects.get_or_create(user=user, post=post)
+        if created:
+            bump_shard(post.pk, 1)
+    if created:
+        bump_listing_versions(f'likes:{user.pk}')
+    return created
+
+
+def remove_like(user, post):
+    """Снимает лайк; False, если его не было."""
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, post=post).delete()
+        if deleted:
+            bump_shard(post.pk, -1)
+    if deleted:
+        bump_listing_versions(f'likes:{user.pk}')
+    return bool(deleted)
+
+
+def liked_post_ids(user, posts):
+    """id постов страницы с лайком пользователя, одним запросом."""
+    if not user.is_authenticated:
+        return set()
+    return set(Like.objects.filter(
+        user=user, post_id__in=[post.pk for post in posts]
+    ).values_list('post_id', flat=True))
+
+
+def merge_like_counters(batch_size=500):
+    """Переносит доли в Post.likes_count, возвращает число постов.
+
+    Все доли одного поста переносятся в одной транзакции: лайк и его
+    снятие могут попасть в разные доли, и по отдельности счётчик ушёл
+    бы ниже нуля. Доля уменьшается на прочитанное значение, а не
+    обнуляется, поэтому лайки, поставленные во время слияния, остаются.
+    """
+    pending = LikeCounter.objects.exclude(count=0).order_by(
+        'post_id'
+    ).values_list('post_id', flat=True).distinct()
+    last = merged = 0
+    while True:
+        post_ids = list(pending.filter(post_id__gt=last)[:batch_size])
+        if not post_ids:
+            return merged
+        last = post_ids[-1]
+        with transaction.atomic():
+            shards = LikeCounter.objects.filter(
+                post_id__in=post_ids
+            ).exclude(count=0).values_list('pk', 'post_id', 'count')
+            totals = Counter()
+            taken = {}
+            for pk, post_id, count in shards:
+                totals[post_id] += count
+                taken[pk] = -count
+            increment_counts(LikeCounter.objects, 'count', taken)
+            increment_counts(Post.objects, 'likes_count', totals)
+            forget_posts(Post.objects.filter(pk__in=totals).values_list(
+                'pk', 'author_id', 'group_id'
+            ))
+        merged += len(totals)
+
+
+def recount_likes():
+    """Пересчитывает likes_count по таблице Like, доли обнуляются.
+
+    Нужен после удаления пользователей: их лайки удаляются каскадом
+    без уменьшения счётчиков. Возвращает число исправленных постов.
+    """
+    LikeCounter.objects.all().delete()
+    actual = Coalesce(Subquery(
+        Like.objects.filter(post=OuterRef('pk')).order_by().values(
+            'post'
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+    drifted = Post.objects.annotate(actual=actual).exclude(
+        likes_count=F('actual')
+    )
+    rows = list(drifted.values_list('pk', 'author_id', 'group_id'))
+    Post.objects.filter(
+        pk__in=drifted.values('pk')
+    ).update(likes_count=actual)
+    forget_posts(rows)
+    return len(rows)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Follow, Timeline
+from posts.utils import backfill_timeline
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписок по уже существующим подпискам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ленты перед заполнением',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create',
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            Timeline.objects.all().delete()
+        follows = Follow.objects.values_list('user_id', 'author_id')
+        count = 0
+        for user_id, author_id in follows.iterator():
+            with transaction.atomic():
+                backfill_timeline(
+                    user_id, author_id, batch_size=options['batch_size']
+                )
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты заполнены по {count} подпискам, '
+            f'записей в лентах: {Timeline.objects.count()}'
+        ))
@@ -0,0 +1,308 @@
+import json
+import logging
+import random
+import shutil
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from core.testing import isolated_settings
+from core.tiered import tiered_cache
+from posts import urls
+from posts.models import Comment, Follow, Group, Post, Tag, User
+from posts.utils import explicit_dates, recount_author_stats
+
+BATCH_SIZE = 1000
+TAGS = 50
+# Маршруты, которые принимают только POST.
+POST_ROUTES = {'post_like', 'post_unlike'}
+
+
+def zipf_weights(count, skew=1.1):
+    """Несколько популярных авторов и постов и длинный хвост остальных."""
+    return [1 / (rank + 1) ** skew for rank in range(count)]
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет временную базу синтетическими данными и замеряет '
+        'задержку всех страниц из posts.urls'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Сколько раз запрашивать каждый адрес',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--output', default='bench.json',
+            help='Куда сохранить результаты в JSON',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого прогона для сравнения',
+        )
+        parser.add_argument(
+            '--max-regression', type=float, default=None,
+            help='Ошибка, если p95 вырос больше чем на столько процентов',
+        )
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        setup_test_environment()
+        # Свой кэш во временной папке: сброс и данные временной базы не
+        # должны попасть в общий кэш запущенного сайта.
+        directory, isolated = isolated_settings()
+        isolated.enable()
+        old_name = connection.settings_dict['NAME']
+        try:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                started = time.perf_counter()
+                self.seed(options)
+                self.stdout.write(
+                    f'Данные созданы за {time.perf_counter() - started:.1f} с'
+                )
+                results = self.run_requests(options['requests'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            isolated.disable()
+            shutil.rmtree(directory, ignore_errors=True)
+        self.report(results)
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'],
+                         options['max_regression'])
+
+    def seed(self, options):
+        cache.clear()
+        password = make_password(None)
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f'{self.fake.user_name()}{number}',
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                    password=password,
+                )
+                for number in range(options['users'])
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        Group.objects.bulk_create(
+            [
+                Group(
+                    title=self.fake.sentence(nb_words=3)[:200],
+                    slug=f'group-{number}',
+                    description=self.fake.paragraph(),
+                )
+                for number in range(options['groups'])
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        author_weights = zipf_weights(len(user_ids))
+        tag_weights = zipf_weights(TAGS)
+        now = timezone.now()
+        pub_date = Post._meta.get_field('pub_date')
+        created = Comment._meta.get_field('created')
+        with explicit_dates(pub_date, created):
+            Post.objects.bulk_create(
+                (
+                    self.make_post(
+                        author_id=author_id,
+                        group_id=random.choice(group_ids + [None]),
+                        text=self.make_text(tag_weights),
+                        pub_date=now - timedelta(
+                            seconds=random.randrange(365 * 24 * 3600)
+                        ),
+                    )
+                    for author_id in random.choices(
+                        user_ids, author_weights, k=options['posts']
+                    )
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            post_ids = list(Post.objects.values_list('pk', flat=True))
+            Comment.objects.bulk_create(
+                (
+                    Comment(
+                        post_id=post_id,
+                        author_id=random.choice(user_ids),
+                        text=self.fake.sentence(),
+                        created=now - timedelta(
+                            seconds=random.randrange(30 * 24 * 3600)
+                        ),
+                    )
+                    for post_id in random.choices(
+                        post_ids, zipf_weights(len(post_ids)),
+                        k=options['comments'],
+                    )
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in zip(
+                    random.choices(user_ids, k=options['follows']),
+                    random.choices(
+                        user_ids, author_weights, k=options['follows']
+                    ),
+                )
+                if user_id != author_id
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        call_command('backfill_timeline', stdout=self.stdout)
+        call_command('index_tags', stdout=self.stdout)
+        recount_author_stats()
+
+    def make_text(self, tag_weights):
+        """Абзац с одним хештегом: популярные теги встречаются чаще."""
+        tag = random.choices(range(TAGS), tag_weights)[0]
+        return f'{self.fake.paragraph(nb_sentences=5)} #tag{tag}'
+
+    def make_post(self, **fields):
+        post = Post(**fields)
+        post.render_text()
+        return post
+
+    def sample_urls(self, reader):
+        """Адрес каждого маршрута posts.urls со случайными аргументами."""
+        author = User.objects.order_by('?').filter(
+            posts__isnull=False
+        ).exclude(pk=reader.pk)[0]
+        post = Post.objects.order_by('?')[0]
+        kwargs = {
+            'slug': Group.objects.order_by('?')[0].slug,
+            'username': author.username,
+            'post_id': post.pk,
+            'name': Tag.objects.order_by('?')[0].name,
+        }
+        sampled = {}
+        for pattern in urls.urlpatterns:
+            arguments = {
+                name: kwargs[name] for name in pattern.pattern.converters
+            }
+            sampled[pattern.name] = reverse(
+                f'{urls.app_name}:{pattern.name}', kwargs=arguments
+            )
+        sampled['search'] += '?q=' + post.text.split()[0]
+        return sampled
+
+    def run_requests(self, repeat):
+        reader = User.objects.filter(follower__isnull=False).first()
+        client = Client()
+        client.force_login(reader)
+        sampled = self.sample_urls(reader)
+        timings = {name: [] for name in sampled}
+        queries = {name: [] for name in sampled}
+        # Адреса обходятся по кругу, чтобы follow и unfollow, like и
+        # unlike чередовались.
+        logging.getLogger('core.queries').setLevel(logging.ERROR)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for name, url in sampled.items():
+                send = client.post if name in POST_ROUTES else client.get
+                start = time.perf_counter()
+                response = send(url)
+                timings[name].append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{url}: ответ {response.status_code}'
+                    )
+                queries[name].append(int(response['X-DB-Queries']))
+        elapsed = time.perf_counter() - started
+        results = {
+            name: {
+                'url': url,
+                'p50_ms': round(percentile(timings[name], 50), 2),
+                'p95_ms': round(percentile(timings[name], 95), 2),
+                'p99_ms': round(percentile(timings[name], 99), 2),
+                'mean_ms': round(statistics.mean(timings[name]), 2),
+                'queries': max(queries[name]),
+            }
+            for name, url in sampled.items()
+        }
+        total = repeat * len(sampled)
+        results['_total'] = {
+            'requests': total,
+            'seconds': round(elapsed, 2),
+            'throughput_rps': round(total / elapsed, 1),
+        }
+        results['_tiered_cache'] = tiered_cache.stats()
+        return results
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"view":<18}{"p50":>8}{"p95":>8}{"p99":>8}{"queries":>9}'
+        )
+        for name, row in results.items():
+            if name.startswith('_'):
+                continue
+            self.stdout.write(
+                f'{name:<18}{row["p50_ms"]:>8}{row["p95_ms"]:>8}'
+                f'{row["p99_ms"]:>8}{row["queries"]:>9}'
+            )
+        total = results['_total']
+        self.stdout.write(
+            f'{total["requests"]} запросов за {total["seconds"]} с, '
+            f'{total["throughput_rps"]} запросов в секунду'
+        )
+        for tier, row in results['_tiered_cache'].items():
+            self.stdout.write(
+                f'{tier.upper()}: {row["hits"]} попаданий, '
+                f'{row["misses"]} промахов, доля {row["hit_rate"]}'
+            )
+
+    def compare(self, results, baseline_path, max_regression):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = []
+        self.stdout.write(f'Сравнение с {baseline_path} (p95):')
+        for name, row in results.items():
+            old = baseline.get(name)
+            if name.startswith('_') or not old:
+                continue
+            change = (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            self.stdout.write(
+                f'{name:<18}{old["p95_ms"]:>8} -> {row["p95_ms"]:<8}'
+                f'{change:+.0f}%  запросов {old["queries"]} -> '
+                f'{row["queries"]}'
+            )
+            if max_regression is not None and change > max_regression:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(
+                'p95 вырос больше допустимого: ' + ', '.join(regressions)
+            )
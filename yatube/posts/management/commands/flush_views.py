@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import get_view_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        'Записывает в базу просмотры из общего буфера в кэше; '
+        'запускается по cron, чтобы они не ждали следующего просмотра'
+    )
+
+    def handle(self, *args, **options):
+        posts = get_view_buffer().flush()
+        self.stdout.write(self.style.SUCCESS(
+            f'Просмотры записаны для постов: {posts}'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.tags import index_posts
+
+
+class Command(BaseCommand):
+    help = 'Заполняет индекс хештегов и упоминаний по уже написанным постам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов разбирать за одну транзакцию',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = Post.objects.only('text', 'pub_date').order_by('pk')
+        last_pk = count = entries = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                entries += index_posts(batch, batch_size=batch_size)
+            last_pk = batch[-1].pk
+            count += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Разобрано постов: {count}, записей в индексе: {entries}'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.likes import merge_like_counters
+
+
+class Command(BaseCommand):
+    help = 'Переносит доли счётчиков лайков в посты'
+
+    def handle(self, *args, **options):
+        posts = merge_like_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Лайки перенесены для постов: {posts}'
+        ))
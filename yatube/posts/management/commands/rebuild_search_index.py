@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов и комментариев'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковый индекс перестроен, строк: {rows}'
+        ))
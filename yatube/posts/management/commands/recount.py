@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.likes import recount_likes
+from posts.utils import recount_author_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, подписок и комментариев авторов '
+        'и лайки постов'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount_author_stats()
+            posts = recount_likes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {len(fixed)}, лайков у постов: '
+            f'{posts}'
+        ))
@@ -0,0 +1,123 @@
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.test import Client
+from django.urls import reverse
+
+from posts.counters import WARMING_HEADER, warming_token
+from posts.models import Group, Post, Tag, User
+from posts.thumbnails import generate_thumbnails
+
+logger = logging.getLogger(__name__)
+
+
+def by_views(queryset):
+    """Сначала те, чьи посты смотрят чаще; без просмотров — в конце."""
+    return queryset.annotate(
+        views=Sum('posts__views_count')
+    ).order_by(F('views').desc(nulls_last=True), 'pk')
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэш после деплоя или сброса: самые посещаемые '
+        'страницы для гостей и миниатюры их картинок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько постов, групп, авторов и тегов прогревать',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько страниц готовить одновременно',
+        )
+        parser.add_argument(
+            '--host',
+            default=next(
+                (host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                 if host != '*'),
+                'localhost',
+            ),
+            help='Host запросов, один из ALLOWED_HOSTS',
+        )
+
+    def handle(self, *args, **options):
+        self.host = options['host']
+        started = time.perf_counter()
+        limit = options['limit']
+        jobs = [(self.warm_page, url) for url in self.hot_urls(limit)]
+        jobs += [
+            (self.warm_thumbnails, name) for name in self.hot_images(limit)
+        ]
+        with ThreadPoolExecutor(options['workers']) as pool:
+            done = Counter(pool.map(lambda job: job[0](job[1]), jobs))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето страниц: {done["page"]}, '
+            f'картинок с миниатюрами: {done["thumbnails"]}, '
+            f'ошибок: {done["error"]} за {elapsed:.1f} с'
+        ))
+
+    def hot_urls(self, limit):
+        """Главная и первые страницы самых посещаемых лент и постов."""
+        urls = [reverse('posts:index')]
+        posts = Post.objects.order_by('-views_count', '-pk')[:limit]
+        for pk in posts.values_list('pk', flat=True):
+            urls.append(reverse('posts:post_detail', args=(pk,)))
+        groups = by_views(Group.objects)[:limit]
+        for slug in groups.values_list('slug', flat=True):
+            urls.append(reverse('posts:group_list', args=(slug,)))
+        authors = by_views(User.objects.filter(posts__isnull=False))
+        for username in authors.values_list(
+                'username', flat=True)[:limit]:
+            urls.append(reverse('posts:profile', args=(username,)))
+        tags = Tag.objects.annotate(
+            posts_count=Count('entries')
+        ).order_by('-posts_count', 'pk')[:limit]
+        for name in tags.values_list('name', flat=True):
+            urls.append(reverse('posts:tag_posts', args=(name,)))
+        return urls
+
+    def hot_images(self, limit):
+        posts = Post.objects.exclude(image='').order_by(
+            '-views_count', '-pk'
+        ).values_list('image', flat=True)[:limit]
+        groups = by_views(Group.objects.exclude(
+            image=''
+        )).values_list('image', flat=True)[:limit]
+        return {*posts, *groups}
+
+    def warm_page(self, url):
+        """Страница рендерится как для гостя и ложится в кэш страниц."""
+        client = Client(
+            HTTP_HOST=self.host, **{WARMING_HEADER: warming_token()}
+        )
+        try:
+            status = client.get(url).status_code
+        except Exception:
+            logger.exception('Не удалось прогреть %s', url)
+            return 'error'
+        finally:
+            connection.close()
+        if status != 200:
+            logger.warning('Прогрев %s: ответ %s', url, status)
+            return 'error'
+        return 'page'
+
+    def warm_thumbnails(self, name):
+        try:
+            generate_thumbnails(name)
+        except Exception:
+            logger.exception('Не удалось подготовить миниатюры %s', name)
+            return 'error'
+        finally:
+            connection.close()
+        return 'thumbnails'
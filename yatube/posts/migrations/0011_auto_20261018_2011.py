@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_auto_20221218_1124'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ('-pub_date', '-id'), 'verbose_name': ('Пост',), 'verbose_name_plural': 'Посты'},
+        ),
+    ]
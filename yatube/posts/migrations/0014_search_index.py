@@ -0,0 +1,70 @@
+from django.db import migrations
+
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE posts_search USING fts5("
+    " text, post_id UNINDEXED,"
+    " tokenize = 'unicode61 remove_diacritics 2')",
+    # Строка поста хранится под rowid = id * 2, комментария — id * 2 + 1.
+    "CREATE TRIGGER posts_post_search_ai AFTER INSERT ON posts_post BEGIN"
+    " INSERT INTO posts_search (rowid, text, post_id)"
+    " VALUES (new.id * 2, new.text, new.id);"
+    " END",
+    "CREATE TRIGGER posts_post_search_au AFTER UPDATE OF text ON posts_post"
+    " BEGIN"
+    " UPDATE posts_search SET text = new.text WHERE rowid = new.id * 2;"
+    " END",
+    "CREATE TRIGGER posts_post_search_ad AFTER DELETE ON posts_post BEGIN"
+    " DELETE FROM posts_search WHERE rowid = old.id * 2;"
+    " END",
+    "CREATE TRIGGER posts_comment_search_ai AFTER INSERT ON posts_comment"
+    " WHEN new.post_id IS NOT NULL BEGIN"
+    " INSERT INTO posts_search (rowid, text, post_id)"
+    " VALUES (new.id * 2 + 1, new.text, new.post_id);"
+    " END",
+    "CREATE TRIGGER posts_comment_search_au"
+    " AFTER UPDATE OF text, post_id ON posts_comment BEGIN"
+    " DELETE FROM posts_search WHERE rowid = old.id * 2 + 1;"
+    " INSERT INTO posts_search (rowid, text, post_id)"
+    " SELECT new.id * 2 + 1, new.text, new.post_id"
+    " WHERE new.post_id IS NOT NULL;"
+    " END",
+    "CREATE TRIGGER posts_comment_search_ad AFTER DELETE ON posts_comment"
+    " BEGIN"
+    " DELETE FROM posts_search WHERE rowid = old.id * 2 + 1;"
+    " END",
+    "INSERT INTO posts_search (rowid, text, post_id)"
+    " SELECT id * 2, text, id FROM posts_post",
+    "INSERT INTO posts_search (rowid, text, post_id)"
+    " SELECT id * 2 + 1, text, post_id FROM posts_comment"
+    " WHERE post_id IS NOT NULL",
+)
+
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS posts_post_search_ai',
+    'DROP TRIGGER IF EXISTS posts_post_search_au',
+    'DROP TRIGGER IF EXISTS posts_post_search_ad',
+    'DROP TRIGGER IF EXISTS posts_comment_search_ai',
+    'DROP TRIGGER IF EXISTS posts_comment_search_au',
+    'DROP TRIGGER IF EXISTS posts_comment_search_ad',
+    'DROP TABLE IF EXISTS posts_search',
+)
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_authorstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SQL), run_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# SQLite добавляет столбец, пересоздавая таблицу posts_post, и вместе со
+# старой таблицей пропадают триггеры поискового индекса из 0014.
+# Строки posts_search привязаны к id постов и остаются верными.
+TRIGGERS_SQL = (
+    'DROP TRIGGER IF EXISTS posts_post_search_ai',
+    'DROP TRIGGER IF EXISTS posts_post_search_au',
+    'DROP TRIGGER IF EXISTS posts_post_search_ad',
+    "CREATE TRIGGER posts_post_search_ai AFTER INSERT ON posts_post BEGIN"
+    " INSERT INTO posts_search (rowid, text, post_id)"
+    " VALUES (new.id * 2, new.text, new.id);"
+    " END",
+    "CREATE TRIGGER posts_post_search_au AFTER UPDATE OF text ON posts_post"
+    " BEGIN"
+    " UPDATE posts_search SET text = new.text WHERE rowid = new.id * 2;"
+    " END",
+    "CREATE TRIGGER posts_post_search_ad AFTER DELETE ON posts_post BEGIN"
+    " DELETE FROM posts_search WHERE rowid = old.id * 2;"
+    " END",
+)
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in TRIGGERS_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_comment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop,
+                             restore_search_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_search_triggers,
+                             migrations.RunPython.noop),
+    ]
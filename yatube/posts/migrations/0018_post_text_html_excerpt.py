@@ -0,0 +1,97 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:40
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+# На SQLite ADD COLUMN с постоянным DEFAULT не пересоздаёт posts_post: на большой
+# таблице это быстро, и триггеры поискового индекса остаются на месте.
+ADD_COLUMNS = (
+    "ALTER TABLE posts_post ADD COLUMN text_html text NOT NULL DEFAULT ''",
+    "ALTER TABLE posts_post"
+    " ADD COLUMN excerpt varchar(200) NOT NULL DEFAULT ''",
+)
+DROP_COLUMNS = (
+    'ALTER TABLE posts_post DROP COLUMN excerpt',
+    'ALTER TABLE posts_post DROP COLUMN text_html',
+)
+
+
+def columns():
+    """Те же столбцы для schema editor на остальных базах."""
+    text_html = models.TextField(blank=True)
+    text_html.set_attributes_from_name('text_html')
+    excerpt = models.CharField(max_length=200, blank=True)
+    excerpt.set_attributes_from_name('excerpt')
+    return text_html, excerpt
+
+
+def add_columns(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in ADD_COLUMNS:
+            schema_editor.execute(statement)
+        return
+    Post = apps.get_model('posts', 'Post')
+    for field in columns():
+        schema_editor.add_field(Post, field)
+
+
+def drop_columns(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP_COLUMNS:
+            schema_editor.execute(statement)
+        return
+    Post = apps.get_model('posts', 'Post')
+    for field in columns():
+        schema_editor.remove_field(Post, field)
+
+
+# Копии posts.models.render_text_html и make_excerpt на момент миграции:
+# миграция не должна меняться вместе с моделью.
+def render_text_html(text):
+    return linebreaks(text, autoescape=True)
+
+
+def make_excerpt(text):
+    return Truncator(text).chars(200)
+
+
+def fill_text(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    for post in Post.objects.only('text').iterator(chunk_size=1000):
+        post.text_html = render_text_html(post.text)
+        post.excerpt = make_excerpt(post.text)
+        batch.append(post)
+        if len(batch) == 1000:
+            Post.objects.bulk_update(batch, ('text_html', 'excerpt'))
+            batch = []
+    Post.objects.bulk_update(batch, ('text_html', 'excerpt'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_columns, drop_columns),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='post',
+                    name='text_html',
+                    field=models.TextField(blank=True, editable=False, verbose_name='Текст в HTML'),
+                ),
+                migrations.AddField(
+                    model_name='post',
+                    name='excerpt',
+                    field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Начало текста'),
+                ),
+            ],
+        ),
+        migrations.RunPython(fill_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+# Как в 0018: на SQLite ADD COLUMN вместо пересоздания posts_post.
+ADD_COLUMN = (
+    'ALTER TABLE posts_post ADD COLUMN views_count integer unsigned'
+    ' NOT NULL DEFAULT 0 CHECK ("views_count" >= 0)'
+)
+DROP_COLUMN = 'ALTER TABLE posts_post DROP COLUMN views_count'
+
+
+def column():
+    """Тот же столбец для schema editor на остальных базах."""
+    field = models.PositiveIntegerField(default=0)
+    field.set_attributes_from_name('views_count')
+    return field
+
+
+def add_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(ADD_COLUMN)
+        return
+    schema_editor.add_field(apps.get_model('posts', 'Post'), column())
+
+
+def drop_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_COLUMN)
+        return
+    schema_editor.remove_field(apps.get_model('posts', 'Post'), column())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_tags_mentions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewFlush',
+            fields=[
+                ('epoch', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Эпоха')),
+                ('flushed', models.DateTimeField(auto_now_add=True, verbose_name='Записана')),
+            ],
+            options={
+                'verbose_name': 'Запись просмотров',
+                'verbose_name_plural': 'Записи просмотров',
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_column, drop_column),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='post',
+                    name='views_count',
+                    field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотров'),
+                ),
+            ],
+        ),
+    ]
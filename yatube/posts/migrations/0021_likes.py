@@ -0,0 +1,90 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Как в 0018: на SQLite ADD COLUMN вместо пересоздания posts_post.
+ADD_COLUMN = (
+    'ALTER TABLE posts_post ADD COLUMN likes_count integer unsigned'
+    ' NOT NULL DEFAULT 0 CHECK ("likes_count" >= 0)'
+)
+DROP_COLUMN = 'ALTER TABLE posts_post DROP COLUMN likes_count'
+
+
+def column():
+    """Тот же столбец для schema editor на остальных базах."""
+    field = models.PositiveIntegerField(default=0)
+    field.set_attributes_from_name('likes_count')
+    return field
+
+
+def add_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(ADD_COLUMN)
+        return
+    schema_editor.add_field(apps.get_model('posts', 'Post'), column())
+
+
+def drop_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_COLUMN)
+        return
+    schema_editor.remove_field(apps.get_model('posts', 'Post'), column())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0020_post_views_count'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_column, drop_column),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='post',
+                    name='likes_count',
+                    field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Лайков'),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LikeCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='Доля')),
+                ('count', models.IntegerField(default=0, verbose_name='Лайков')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='like_counters', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Доля счётчика лайков',
+                'verbose_name_plural': 'Доли счётчиков лайков',
+            },
+        ),
+        migrations.CreateModel(
+            name='Like',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Поставлен')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='likes', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Лайк',
+                'verbose_name_plural': 'Лайки',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='likecounter',
+            constraint=models.UniqueConstraint(fields=('post', 'shard'), name='unique_like_counter_shard'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_like'),
+        ),
+    ]
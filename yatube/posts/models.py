@@ -1,8 +1,30 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+from core.managers import CachedManager
 
 User = get_user_model()
 
+EXCERPT_LENGTH = 200
+TAG_LENGTH = 50
+# Поля автора, которые видны на страницах; пароль в кэш не попадает.
+AUTHOR_FIELDS = ('username', 'first_name', 'last_name')
+
+User.add_to_class(
+    'cached', CachedManager(lookups=('username',), fields=AUTHOR_FIELDS)
+)
+
+
+def render_text_html(text):
+    """То же, что фильтр linebreaks в шаблоне, с экранированием."""
+    return linebreaks(text, autoescape=True)
+
+
+def make_excerpt(text):
+    return Truncator(text).chars(EXCERPT_LENGTH)
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -25,6 +47,8 @@ class Group(models.Model):
         upload_to='posts/',
         blank=True)
 
+    cached = CachedManager(lookups=('slug',))
+
     class Meta:
         verbose_name = 'Сообщество'
         verbose_name_plural = 'Сообщества'
@@ -40,6 +64,8 @@ class Post(models.Model):
     )
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата поста')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения')
     group = models.ForeignKey(
         Group,
         verbose_name='Сообщество',
@@ -58,15 +84,145 @@ class Post(models.Model):
         'Картинка',
         upload_to='posts/',
         blank=True)
+    text_html = models.TextField(
+        'Текст в HTML',
+        blank=True,
+        editable=False)
+    excerpt = models.CharField(
+        'Начало текста',
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        editable=False)
+    views_count = models.PositiveIntegerField(
+        'Просмотров',
+        default=0,
+        editable=False)
+    likes_count = models.PositiveIntegerField(
+        'Лайков',
+        default=0,
+        editable=False)
+
+    cached = CachedManager()
 
     class Meta:
-        ordering = ('-pub_date'),
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Пост',
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        self.render_text()
+        super().save(*args, **kwargs)
+
+    def render_text(self):
+        """Готовит text_html и excerpt; bulk_create его не вызывает сам."""
+        self.text_html = render_text_html(self.text)
+        self.excerpt = make_excerpt(self.text)
+
+
+class Like(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='likes',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='likes',
+        verbose_name='Пост',
+    )
+    created = models.DateTimeField('Поставлен', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Лайк'
+        verbose_name_plural = 'Лайки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_like'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} → {self.post}'
+
+
+class LikeCounter(models.Model):
+    """Доля счётчика лайков, ещё не перенесённая в Post.likes_count.
+
+    Лайк прибавляется к случайной из LIKE_SHARDS строк, поэтому лайки
+    одного популярного поста не ждут друг друга на одной строке.
+    В отдельной строке значение бывает и отрицательным.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='like_counters',
+        verbose_name='Пост',
+    )
+    shard = models.PositiveSmallIntegerField('Доля')
+    count = models.IntegerField('Лайков', default=0)
+
+    class Meta:
+        verbose_name = 'Доля счётчика лайков'
+        verbose_name_plural = 'Доли счётчиков лайков'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'shard'], name='unique_like_counter_shard'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post}: {self.count}'
+
+
+class ViewFlush(models.Model):
+    """Эпоха общего буфера просмотров, уже записанная в posts_post."""
+    epoch = models.BigIntegerField('Эпоха', primary_key=True)
+    flushed = models.DateTimeField('Записана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Запись просмотров'
+        verbose_name_plural = 'Записи просмотров'
+
+    def __str__(self):
+        return str(self.epoch)
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько записей файла импорта уже в базе.
+
+    Пишется в транзакции пачки: после падения импорт не повторит
+    закоммиченную пачку.
+    """
+    name = models.CharField('Импорт', max_length=255, unique=True)
+    done = models.PositiveIntegerField('Обработано записей', default=0)
+    updated = models.DateTimeField('Обновлён', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Прогресс импорта'
+        verbose_name_plural = 'Прогресс импортов'
+
+    def __str__(self):
+        return f'{self.name}: {self.done}'
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -92,9 +248,15 @@ class Comment(models.Model):
     )
 
     class Meta:
-        ordering = ('-created',)
+        ordering = ('-created', '-id')
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -122,6 +284,154 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique_follow'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class Timeline(models.Model):
+    """Лента подписок, разложенная по читателям при публикации поста."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата поста')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, которые обновляются вместе с записями."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    follows_count = models.PositiveIntegerField('Подписок', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class Tag(models.Model):
+    """Хештег из текста постов, имя в нижнем регистре без «#»."""
+    name = models.CharField('Имя', max_length=TAG_LENGTH, unique=True)
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'Хештег'
+        verbose_name_plural = 'Хештеги'
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class TaggedPost(models.Model):
+    """Пост с хештегом; дата копируется для keyset-пагинации по тегу."""
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='entries',
+        verbose_name='Хештег',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tag_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата поста')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        verbose_name = 'Пост с хештегом'
+        verbose_name_plural = 'Посты с хештегами'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tag', 'post'], name='unique_tagged_post'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', '-pub_date', '-post'],
+                name='tagged_tag_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.tag} в {self.post}'
+
+
+class Mention(models.Model):
+    """Упоминание @username в посте."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        verbose_name='Упомянутый',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='mention_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата поста')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        verbose_name = 'Упоминание'
+        verbose_name_plural = 'Упоминания'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_mention'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='mention_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} в {self.post}'
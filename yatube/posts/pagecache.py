@@ -0,0 +1,141 @@
+"""Кэш целых страниц для гостей с суррогатными ключами.
+
+Гость без сессии видит одну и ту же страницу, поэтому она отдаётся из
+кэша без view и шаблонов. Ключи страницы — области версий из utils:
+области самой страницы ('group:<id>' и т. п.) и 'post:<id>' для каждого
+поста на ней. Запись хранит версии ключей на момент рендера. Сигналы
+Post, Comment и Follow сдвигают версии своих областей, и устаревают
+ровно те страницы, у которых поменялась версия хотя бы одного ключа.
+
+Устаревшую или истекающую страницу рендерит один запрос (core.stampede),
+а остальные, пока он не закончил, получают прежнюю версию. Если
+прежней нет, они недолго ждут, пока он её положит.
+
+Те же ключи уходят в заголовке Surrogate-Key. Сбрасывать страницы у
+прокси перед сайтом пока некому, поэтому ответ идёт с no-cache: прокси
+может хранить страницу, но каждый раз сверяет её с сайтом по ETag.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+
+from core.stampede import acquire, is_due, release, store, wait
+
+from .utils import listing_versions, request_scopes
+
+
+def add_surrogate_keys(request, keys):
+    request.surrogate_keys = getattr(request, 'surrogate_keys', set())
+    request.surrogate_keys.update(keys)
+
+
+def page_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:page:{path}'
+
+
+def surrogate_header(keys):
+    return ' '.join(key.replace(':', '-') for key in sorted(keys))
+
+
+def is_cacheable(request, response):
+    """Страница без форм с CSRF, без cookie и без ошибок."""
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+    )
+
+
+def cached_response(entry, state):
+    keys, versions, content, content_type = entry.value
+    response = HttpResponse(content, content_type)
+    response['X-Page-Cache'] = state
+    return public(response, keys)
+
+
+def public(response, keys):
+    response['Surrogate-Key'] = surrogate_header(keys)
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def render_page(request, key, scopes, view, args, kwargs):
+    # Версии областей страницы читаются до рендера (или их уже
+    # прочитал versioned): запись, случившаяся во время рендера,
+    # уже не совпадёт с ними.
+    before = (
+        getattr(request, 'listing_versions', None)
+        or listing_versions(scopes)
+    )
+    add_surrogate_keys(request, scopes)
+    started = time.time()
+    response = view(request, *args, **kwargs)
+    if not is_cacheable(request, response):
+        patch_cache_control(response, private=True)
+        return response
+    keys = [*scopes, *sorted(request.surrogate_keys - set(scopes))]
+    versions = [*before, *listing_versions(keys[len(scopes):])]
+    store(
+        key,
+        (keys, versions, response.content, response['Content-Type']),
+        settings.PAGE_CACHE_TIMEOUT,
+        started,
+    )
+    response['X-Page-Cache'] = 'MISS'
+    return public(response, keys)
+
+
+def cached_or_lock(key):
+    """Страница из кэша или (None, токен блокировки рендера или None)."""
+    entry = cache.get(key)
+    if entry is not None:
+        keys, versions = entry.value[:2]
+        if listing_versions(keys) == versions and not is_due(entry):
+            return cached_response(entry, 'HIT'), None
+    token = acquire(key)
+    if token:
+        return None, token
+    # Страницу уже рендерит другой запрос.
+    if entry is not None:
+        return cached_response(entry, 'STALE'), None
+    entry = wait(key)
+    if entry is not None:
+        return cached_response(entry, 'HIT'), None
+    return None, None
+
+
+def anonymous_page_cache(scopes_func):
+    """Отдаёт гостям страницу из кэша, пока версии её ключей не сменились.
+
+    scopes_func — та же функция областей, что и у versioned(); если она
+    вернула None, объекта нет и ответ (404) не кэшируется.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True)
+                return response
+            scopes = request_scopes(request, scopes_func, *args, **kwargs)
+            if not scopes:
+                return view(request, *args, **kwargs)
+            key = page_key(request)
+            response, token = cached_or_lock(key)
+            if response is not None:
+                return response
+            try:
+                return render_page(request, key, scopes, view, args, kwargs)
+            finally:
+                if token:
+                    release(key, token)
+        return wrapper
+    return decorator
@@ -0,0 +1,89 @@
+"""Полнотекстовый поиск по постам и комментариям через SQLite FTS5.
+
+Таблица posts_search и триггеры, которые держат её в актуальном
+состоянии, создаются миграцией 0014_search_index.
+"""
+import re
+
+from django.db import connection
+
+from .models import Post
+
+WORD_RE = re.compile(r'\w+')
+MAX_WORDS = 8
+
+# Совпадение в самом посте весит вдвое больше, чем в комментарии.
+RANKED_SQL = (
+    'SELECT post_id FROM ('
+    ' SELECT post_id,'
+    ' CASE rowid %% 2 WHEN 0 THEN rank * 2 ELSE rank END AS score'
+    ' FROM posts_search WHERE posts_search MATCH %s'
+    ') GROUP BY post_id ORDER BY min(score), post_id DESC'
+    ' LIMIT %s OFFSET %s'
+)
+COUNT_SQL = (
+    'SELECT COUNT(DISTINCT post_id) FROM posts_search'
+    ' WHERE posts_search MATCH %s'
+)
+REBUILD_SQL = (
+    'DELETE FROM posts_search',
+    'INSERT INTO posts_search (rowid, text, post_id)'
+    ' SELECT id * 2, text, id FROM posts_post',
+    'INSERT INTO posts_search (rowid, text, post_id)'
+    ' SELECT id * 2 + 1, text, post_id FROM posts_comment'
+    ' WHERE post_id IS NOT NULL',
+    "INSERT INTO posts_search (posts_search) VALUES ('optimize')",
+)
+
+
+def build_match(query):
+    """Запрос пользователя в безопасное выражение FTS5 (слова по префиксу)."""
+    words = WORD_RE.findall(query)[:MAX_WORDS]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class SearchResults:
+    """Найденные посты по убыванию bm25 в виде, понятном Paginator."""
+
+    def __init__(self, query):
+        self.match = build_match(query)
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(COUNT_SQL, [self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.match:
+            return []
+        start = index.start or 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                RANKED_SQL, [self.match, index.stop - start, start]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_posts(query):
+    if connection.vendor != 'sqlite':
+        return Post.objects.select_related('author', 'group').filter(
+            text__icontains=query
+        )
+    return SearchResults(query)
+
+
+def rebuild_search_index():
+    with connection.cursor() as cursor:
+        for statement in REBUILD_SQL:
+            cursor.execute(statement)
+        cursor.execute('SELECT COUNT(*) FROM posts_search')
+        return cursor.fetchone()[0]
@@ -0,0 +1,214 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .models import AuthorStats, Comment, Follow, Group, Post, Timeline, User
+from .tags import index_posts
+from .tasks import fan_out_post, fill_follow_timeline
+from .thumbnails import generate_thumbnails
+from .utils import bump_listing_versions, touch_posts
+
+CARD_FIELDS = {
+    Group: ('title', 'slug'),
+    User: ('username', 'first_name', 'last_name'),
+}
+OLD_VALUES = {
+    Post: ('group_id', 'image'),
+    Group: ('image',),
+}
+
+
+@receiver(post_save, sender=Post)
+def queue_fan_out(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора задачей в фоне."""
+    if created:
+        fan_out_post.delay(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_tags(sender, instance, update_fields=None, **kwargs):
+    """Хештеги и упоминания пересобираются, когда меняется текст."""
+    if update_fields is None or 'text' in update_fields:
+        index_posts([instance])
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline(sender, instance, created, **kwargs):
+    """При подписке в ленту читателя добавляются посты автора."""
+    if created:
+        fill_follow_timeline.delay(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    """При отписке посты автора убираются из ленты читателя."""
+    Timeline.objects.filter(
+        user_id=instance.user_id,
+        post__author_id=instance.author_id,
+    ).delete()
+
+
+def bump_stats(user_id, field, delta):
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        bump_stats(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    bump_stats(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        bump_stats(instance.user_id, 'follows_count', 1)
+        bump_stats(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    bump_stats(instance.user_id, 'follows_count', -1)
+    bump_stats(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created and instance.author_id:
+        bump_stats(instance.author_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    if instance.author_id:
+        bump_stats(instance.author_id, 'comments_count', -1)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Group)
+def remember_old_values(sender, instance, **kwargs):
+    """Прежние группа поста и картинка: по ним видно, что изменилось."""
+    fields = OLD_VALUES[sender]
+    old = None
+    if instance.pk:
+        old = sender.objects.filter(
+            pk=instance.pk
+        ).values_list(*fields).first()
+    for field, value in zip(fields, old or (None,) * len(fields)):
+        setattr(instance, f'_old_{field}', value)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_listings(sender, instance, **kwargs):
+    """Пост меняет главную, ленту группы, профиль автора и себя."""
+    scopes = {'index', f'author:{instance.author_id}', f'post:{instance.pk}'}
+    old_group_id = getattr(instance, '_old_group_id', None)
+    for group_id in (instance.group_id, old_group_id):
+        if group_id:
+            scopes.add(f'group:{group_id}')
+    bump_listing_versions(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post(sender, instance, **kwargs):
+    bump_listing_versions(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    bump_listing_versions(f'group:{instance.pk}')
+
+
+@receiver(pre_save, sender=Group)
+@receiver(pre_save, sender=User)
+def remember_card_fields(sender, instance, update_fields=None, **kwargs):
+    """Запоминает поля группы или автора, которые видны в карточке поста.
+
+    Сохранение одного last_login при входе лишнего запроса не делает.
+    """
+    fields = CARD_FIELDS[sender]
+    instance._old_card_fields = None
+    if update_fields and not set(fields) & set(update_fields):
+        return
+    if instance.pk:
+        instance._old_card_fields = sender.objects.filter(
+            pk=instance.pk
+        ).values_list(*fields).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=User)
+def refresh_cards(sender, instance, created, **kwargs):
+    """Переименование группы или автора обновляет карточки их постов.
+
+    Своя страница сбрасывается и тогда, когда постов нет, а у автора —
+    ещё и страницы постов, где он оставлял комментарии.
+    """
+    old = getattr(instance, '_old_card_fields', None)
+    if created or old is None:
+        return
+    if old == tuple(getattr(instance, f) for f in CARD_FIELDS[sender]):
+        return
+    touch_posts(instance.posts.all())
+    if sender is Group:
+        bump_listing_versions(f'group:{instance.pk}')
+        return
+    commented = Comment.objects.filter(author=instance).order_by().values_list(
+        'post_id', flat=True
+    ).distinct()
+    bump_listing_versions(
+        f'author:{instance.pk}', *(f'post:{pk}' for pk in commented)
+    )
+
+
+@receiver(pre_delete, sender=Group)
+def refresh_group_cards(sender, instance, **kwargs):
+    """Посты удалённой группы остаются, но без ссылки на неё."""
+    touch_posts(instance.posts.all())
+
+
+@receiver(post_delete, sender=Group)
+def invalidate_group_links(sender, instance, **kwargs):
+    bump_listing_versions('index', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profiles(sender, instance, **kwargs):
+    """Подписка меняет счётчики и кнопку в профилях обоих."""
+    bump_listing_versions(
+        f'author:{instance.author_id}', f'author:{instance.user_id}'
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_new_author(sender, instance, created, **kwargs):
+    if created:
+        bump_listing_versions(f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Group)
+def prepare_thumbnails(sender, instance, **kwargs):
+    """Миниатюры новой картинки считаются в фоне после коммита."""
+    old_image = getattr(instance, '_old_image', None)
+    if instance.image and instance.image.name != old_image:
+        name = instance.image.name
+        transaction.on_commit(lambda: generate_thumbnails.delay(name))
@@ -0,0 +1,75 @@
+"""Индекс хештегов и упоминаний в тексте постов.
+
+Теги и упоминания разбираются при сохранении поста и лежат в таблицах
+TaggedPost и Mention, поэтому страница тега и лента упоминаний читают
+индекс по (ключ, дата), а не ищут LIKE по всем текстам.
+"""
+import re
+
+from .models import TAG_LENGTH, Mention, Tag, TaggedPost, User
+
+# Перед знаком не должно быть буквы или «/»: адрес почты и якорь
+# ссылки тегом и упоминанием не считаются.
+TAG_RE = re.compile(rf'(?<![\w&#/])#(\w{{1,{TAG_LENGTH}}})(?!\w)')
+MENTION_RE = re.compile(r'(?<![\w@/])@([\w.+-]*\w)')
+
+
+def parse_tags(text):
+    return {name.lower() for name in TAG_RE.findall(text)}
+
+
+def parse_mentions(text):
+    return set(MENTION_RE.findall(text))
+
+
+def index_posts(posts, batch_size=1000):
+    """Пересобирает теги и упоминания постов, возвращает число записей.
+
+    posts — уже сохранённые посты с полями text и pub_date. Упоминание
+    пользователя, которого ещё нет, не записывается; такие посты
+    подхватит повторный запуск manage.py index_tags.
+    """
+    posts = list(posts)
+    tags = {post.pk: parse_tags(post.text) for post in posts}
+    mentions = {post.pk: parse_mentions(post.text) for post in posts}
+    names = set().union(*tags.values())
+    usernames = set().union(*mentions.values())
+    tag_ids = user_ids = {}
+    if names:
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in names],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        tag_ids = dict(
+            Tag.objects.filter(name__in=names).values_list('name', 'pk')
+        )
+    if usernames:
+        user_ids = dict(
+            User.objects.filter(
+                username__in=usernames
+            ).values_list('username', 'pk')
+        )
+    pks = [post.pk for post in posts]
+    TaggedPost.objects.filter(post_id__in=pks).delete()
+    Mention.objects.filter(post_id__in=pks).delete()
+    entries = TaggedPost.objects.bulk_create(
+        (
+            TaggedPost(tag_id=tag_ids[name], post_id=post.pk,
+                       pub_date=post.pub_date)
+            for post in posts
+            for name in tags[post.pk]
+        ),
+        batch_size=batch_size,
+    )
+    entries += Mention.objects.bulk_create(
+        (
+            Mention(user_id=user_ids[username], post_id=post.pk,
+                    pub_date=post.pub_date)
+            for post in posts
+            for username in mentions[post.pk]
+            if username in user_ids
+        ),
+        batch_size=batch_size,
+    )
+    return len(entries)
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from core.tasks import task
+
+from .likes import merge_like_counters
+from .models import Follow, Post
+from .utils import backfill_timeline, fan_out_posts
+
+
+@task()
+def fan_out_post(post_id):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Если пост успели удалить, фильтр пустой и делать нечего.
+    """
+    fan_out_posts(Post.objects.filter(pk=post_id))
+
+
+@task()
+def fill_follow_timeline(user_id, author_id):
+    """Добавляет посты автора в ленту нового подписчика.
+
+    Если читатель успел отписаться, лента не заполняется заново.
+    """
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        backfill_timeline(user_id, author_id)
+
+
+@task()
+def merge_likes():
+    merge_like_counters()
+
+
+def schedule_merge_likes():
+    """Одна задача слияния на LIKES_MERGE_INTERVAL, сколько бы ни лайкали."""
+    interval = settings.LIKES_MERGE_INTERVAL
+    if cache.add('posts:likes:merge', 1, interval):
+        merge_likes.delay(countdown=interval)
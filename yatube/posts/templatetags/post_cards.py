@@ -0,0 +1,50 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.likes import liked_post_ids
+from posts.pagecache import add_surrogate_keys
+
+register = template.Library()
+
+CARD_TIMEOUT = 24 * 60 * 60
+
+
+def card_key(post):
+    """Ключ меняется с updated_at, поэтому старые карточки не удаляются,
+    а просто перестают читаться и уходят из кэша по LRU."""
+    return f'posts:card:{post.pk}:{post.updated_at.timestamp():.6f}'
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """HTML карточек страницы: одно чтение get_many на всю страницу.
+
+    Карточка не зависит от того, кто смотрит, и рендерится только
+    для постов, которых ещё нет в кэше. Кнопка лайка зависит, поэтому
+    она дописывается после карточки при каждом запросе, а лайки
+    читателя берутся одним запросом на страницу.
+    """
+    keys = {card_key(post): post for post in posts}
+    cards = cache.get_many(keys)
+    missing = {
+        key: render_to_string(
+            'posts/includes/post_card.html', {'post': post}
+        )
+        for key, post in keys.items()
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    cards.update(missing)
+    request = context['request']
+    add_surrogate_keys(request, (f'post:{post.pk}' for post in posts))
+    liked = liked_post_ids(request.user, posts)
+    button = get_template('posts/includes/like_button.html')
+    return [
+        mark_safe(cards[key] + button.render(
+            {'post': post, 'liked': post.pk in liked}, request
+        ))
+        for key, post in keys.items()
+    ]
@@ -0,0 +1,131 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin
+from posts.models import Comment, Group, Post, User
+
+
+class ApiTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for number in range(13):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Пост {number}',
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds(self):
+        """Ленты отдают JSON с курсором на следующую страницу."""
+        urls = (
+            reverse('api:index'),
+            reverse('api:group_list', args=(self.group.slug,)),
+            reverse('api:profile', args=(self.author.username,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertWithinQueryBudget(response)
+                data = response.json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['text'], 'Пост 12')
+                self.assertEqual(data['results'][0]['group']['slug'], 'group')
+                self.assertIsNone(data['previous'])
+                data = self.client.get(data['next']).json()
+                self.assertEqual(len(data['results']), 3)
+                self.assertIsNone(data['next'])
+
+    def test_post_detail(self):
+        response = self.client.get(
+            reverse('api:post_detail', args=(self.post.pk,))
+        )
+        self.assertWithinQueryBudget(response)
+        data = response.json()
+        self.assertEqual(data['author'], 'author')
+        self.assertEqual(data['comments'][0]['text'], 'Комментарий')
+        self.assertEqual(data['comments'][0]['author'], 'author')
+
+    @override_settings(COMMENTS_NUMBER=1)
+    def test_post_comments_are_paged(self):
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый'
+        )
+        data = self.client.get(
+            reverse('api:post_detail', args=(self.post.pk,))
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']], ['Новый']
+        )
+        data = self.client.get(data['comments_next']).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий'],
+        )
+        self.assertIsNone(data['comments_next'])
+
+    def test_unknown_objects(self):
+        urls = (
+            reverse('api:group_list', args=('missing',)),
+            reverse('api:profile', args=('missing',)),
+            reverse('api:post_detail', args=(0,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_not_modified(self):
+        """Повторный опрос без изменений получает 304 без запросов к базе."""
+        url = reverse('api:index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-DB-Queries'], '0')
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        url = reverse('api:post_detail', args=(self.post.pk,))
+        response = self.client.get(url)
+        # По секундному Last-Modified изменение в ту же секунду дало бы 304.
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Ещё один'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['comments']), 2)
+
+    def test_rename_changes_post_etag(self):
+        """Имя автора и название группы в ответе сбрасывают его ETag."""
+        url = reverse('api:post_detail', args=(self.post.pk,))
+        etag = self.client.get(url)['ETag']
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['group']['title'], 'Новое название')
+        etag = response['ETag']
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed'
+        author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['author'], 'renamed')
+
+    def test_missing_post_has_no_etag(self):
+        response = self.client.get(reverse('api:post_detail', args=(0,)))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
@@ -1,6 +1,13 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Group, Post, User
+from core.tiered import tiered_cache
+from posts.counters import write_views
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+from posts.utils import listing_versions
 
 
 class PostModelTest(TestCase):
@@ -24,6 +31,17 @@ class PostModelTest(TestCase):
         post_obj_name = post.text[:15]
         self.assertEqual(post_obj_name, str(post))
 
+    def test_text_html_and_excerpt(self):
+        """При сохранении готовятся HTML текста и короткое начало."""
+        post = Post.objects.create(
+            author=self.user, text='<b>Жирный</b>\n\n' + 'слово ' * 100
+        )
+        self.assertTrue(
+            post.text_html.startswith('<p>&lt;b&gt;Жирный&lt;/b&gt;</p>')
+        )
+        self.assertEqual(len(post.excerpt), 200)
+        self.assertTrue(post.excerpt.endswith('…'))
+
     def test_model_group_have_correct_object_names(self):
         """Проверяем, что у модели Group корректно работает __str__."""
         group = PostModelTest.group
@@ -61,3 +79,113 @@ class PostModelTest(TestCase):
         self.assertEqual(verbose_title, 'Название группы')
         self.assertEqual(verbose_slug, 'slug')
         self.assertEqual(verbose_description, 'Описание группы')
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, подписками и комментариями."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.follows_count, 1)
+        self.assertEqual(self.reader.stats.comments_count, 1)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 0)
+        self.assertEqual(self.author.stats.followers_count, 0)
+        self.assertEqual(self.reader.stats.follows_count, 0)
+        self.assertEqual(self.reader.stats.comments_count, 0)
+
+    def test_recount_fixes_drift(self):
+        """Команда recount исправляет разошедшиеся счётчики."""
+        Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        scopes = (f'author:{self.author.pk}', f'author:{self.reader.pk}')
+        before = listing_versions(scopes)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 1
+        )
+        self.assertTrue(AuthorStats.objects.filter(user=self.reader).exists())
+        # Страницы с исправленными счётчиками не отдаются из кэша.
+        after = listing_versions(scopes)
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+
+class CachedManagerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth', password='pw')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        tiered_cache.clear_local()
+
+    def test_get_reads_database_once(self):
+        with self.assertNumQueries(1):
+            post = Post.cached.get(pk=self.posts[0].pk)
+        with self.assertNumQueries(0):
+            again = Post.cached.get(id=str(self.posts[0].pk))
+        self.assertEqual(again, post)
+        self.assertEqual(again.text, 'Пост 0')
+
+    def test_missing_object_is_cached(self):
+        for queries in (1, 0):
+            with self.assertNumQueries(queries):
+                with self.assertRaises(Group.DoesNotExist):
+                    Group.cached.get(slug='missing')
+        Group.objects.create(title='Новая', slug='missing')
+        self.assertEqual(Group.cached.get(slug='missing').title, 'Новая')
+
+    def test_get_many_fetches_misses_in_one_query(self):
+        pks = [post.pk for post in self.posts]
+        Post.cached.get(pk=pks[1])
+        with self.assertNumQueries(1):
+            found = Post.cached.get_many([*pks, 0])
+        self.assertEqual(list(found), pks)
+        with self.assertNumQueries(0):
+            Post.cached.get_many(pks)
+
+    def test_save_and_rename_forget_cached(self):
+        Group.cached.get(slug='group')
+        self.group.slug = 'renamed'
+        self.group.save()
+        self.addCleanup(Group.objects.filter(pk=self.group.pk).update,
+                        slug='group')
+        with self.assertRaises(Group.DoesNotExist):
+            Group.cached.get(slug='group')
+        self.assertEqual(Group.cached.get(slug='renamed'), self.group)
+
+    def test_update_needs_forget(self):
+        post = self.posts[0]
+        Post.cached.get(pk=post.pk)
+        write_views({post.pk: 3})
+        self.assertEqual(Post.cached.get(pk=post.pk).views_count, 3)
+
+    def test_user_is_cached_without_password(self):
+        user = User.cached.get(username='auth')
+        self.assertEqual(user, self.user)
+        self.assertIn('password', user.get_deferred_fields())
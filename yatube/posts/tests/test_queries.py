@@ -0,0 +1,174 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin, clear_caches
+from posts import views
+from posts.models import Comment, Follow, Group, Post, User
+
+# Полный просмотр таблицы (SCAN без индекса) и сортировка во временном
+# B-дереве означают, что запросу не хватает индекса.
+BAD_PLAN_STEPS = ('USE TEMP B-TREE',)
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def bad_plan_steps(sql):
+    """Шаги плана с полным просмотром таблицы или временной сортировкой."""
+    return [
+        step for step in query_plan(sql)
+        if step.startswith(BAD_PLAN_STEPS)
+        or (step.startswith('SCAN') and ' INDEX ' not in f'{step} ')
+    ]
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN для всех запросов страниц со списками постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Пост {number} #тег для @reader',
+            )
+            for number in range(15)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def assert_plans_use_indexes(self, url, data=None):
+        # Иначе запросы, которые закрыл кэш прошлой страницы, не попадут
+        # в проверку.
+        clear_caches()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with self.subTest(url=url, data=data, sql=sql):
+                self.assertEqual(bad_plan_steps(sql), [])
+
+    def test_listing_query_plans(self):
+        """Страницы читают индексы без полных просмотров и сортировок."""
+        cursor = self.client.get(
+            reverse('posts:index')
+        ).context['page_obj'].next_cursor
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', args=(self.posts[0].pk,)),
+            reverse('posts:post_comments', args=(self.posts[0].pk,)),
+            reverse('posts:tag_posts', args=('тег',)),
+            reverse('posts:mentions'),
+        )
+        for url in urls:
+            self.assert_plans_use_indexes(url)
+            self.assert_plans_use_indexes(url, {'page': 2})
+            self.assert_plans_use_indexes(url, {'after': cursor})
+            self.assert_plans_use_indexes(url, {'before': cursor})
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Страницы укладываются в бюджет, объявленный через @query_budget."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for number in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Пост {number} #тег для @reader',
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Комментарий'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    # Задачи, которые ставит запрос, в его бюджет входят только вставкой
+    # в очередь, а не своим выполнением.
+    @override_settings(TASKS_EAGER=False)
+    def test_views_stay_within_query_budget(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            reverse('posts:follow_index'),
+            reverse('posts:tag_posts', args=('тег',)),
+            reverse('posts:mentions'),
+            reverse('posts:search') + '?q=Пост',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+                self.assertIn('X-DB-Time', response)
+
+    def test_listings_do_not_load_text(self):
+        """Ленты читают excerpt, а полный текст поста не загружают."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+            reverse('posts:tag_posts', args=('тег',)),
+            reverse('posts:mentions'),
+        )
+        for url in urls:
+            with self.subTest(url=url), \
+                    CaptureQueriesContext(connection) as context:
+                self.client.get(url)
+            sql = ' '.join(query['sql'] for query in context)
+            self.assertIn('"posts_post"."excerpt"', sql)
+            self.assertNotIn('"posts_post"."text",', sql)
+
+    def test_stats_headers_only_for_internal_ips(self):
+        response = self.client.get(
+            reverse('posts:index'), REMOTE_ADDR='203.0.113.5'
+        )
+        for header in ('X-DB-Queries', 'X-DB-Time', 'X-DB-Budget'):
+            with self.subTest(header=header):
+                self.assertNotIn(header, response)
+
+    def test_over_budget_is_logged(self):
+        """Превышение бюджета пишется в лог предупреждением."""
+        with mock.patch.object(views.index, 'query_budget', 1), \
+                self.assertLogs('core.queries', 'WARNING') as logs:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response['X-DB-Budget'], '1')
+        self.assertIn('(budget 1)', logs.output[0])
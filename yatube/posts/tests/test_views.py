@@ -1,12 +1,34 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
 from django import forms
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
 from django.urls import reverse
+from django.utils import timezone
 
 from ..forms import PostForm
-from posts.models import Follow, Group, Post, User
+from core.models import Task
+from core.stampede import acquire, release
+from core.tiered import tiered_cache
+from posts.counters import BUFFERS, WARMING_HEADER, write_views
+from posts.likes import liked_post_ids, merge_like_counters, recount_likes
+from posts.models import (Comment, Follow, Group, ImportCheckpoint, Like,
+                          LikeCounter, Mention, Post, TaggedPost, Timeline,
+                          User, ViewFlush)
+from posts.pagecache import page_key
+from posts.tags import parse_mentions, parse_tags
+from posts.thumbnails import generate_thumbnails
+from posts.utils import listing_versions
 
 
 class PostTests(TestCase):
@@ -197,6 +219,54 @@ class PaginatorTests(TestCase):
                             nums
                         )
 
+    def test_cursor_paginator(self):
+        """Курсоры after/before листают те же посты, что и номера страниц."""
+        RANGE: int = 13
+        POSTS_NUMBER: int = 10
+        for post in range(RANGE):
+            Post.objects.create(
+                text=f'Тестовый текст {post}',
+                author=self.user,
+                group=self.group,
+            )
+        paginator_urls = (
+            ('posts:index', None),
+            ('posts:group_list', (self.group.slug,)),
+            ('posts:profile', (self.user.username,)),
+            ('posts:follow_index', None),
+        )
+        for address, args in paginator_urls:
+            with self.subTest(address=address):
+                url = reverse(address, args=args)
+                first_page = self.authorized_follower.get(url)
+                cursor = first_page.context['page_obj'].next_cursor
+                second_page = self.authorized_follower.get(
+                    url, {'after': cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    list(second_page),
+                    list(self.authorized_follower.get(
+                        url, {'page': 2}
+                    ).context['page_obj'])
+                )
+                self.assertFalse(second_page.has_next())
+                back = self.authorized_follower.get(
+                    url, {'before': second_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(back), POSTS_NUMBER)
+                self.assertEqual(
+                    list(back),
+                    list(first_page.context['page_obj'])
+                )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор не ломает страницу."""
+        Post.objects.create(text='Тестовый текст', author=self.user)
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'after': 'не-курсор'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 1)
+
 
 class FollowerTests(TestCase):
     @classmethod
@@ -270,3 +340,898 @@ class FollowerTests(TestCase):
             follow
         count_2 = Follow.objects.count()
         self.assertEqual(count_2, count + 1)
+
+    def test_timeline_follows_subscriptions(self):
+        """Лента подписок обновляется при постах, подписке и отписке."""
+        self.authorized_follower.get(
+            reverse('posts:profile_follow', args=(self.following,))
+        )
+        self.assertTrue(
+            self.follower.timeline.filter(post=self.post).exists()
+        )
+        new_post = Post.objects.create(
+            author=self.following,
+            text='Новый пост для ленты',
+        )
+        response = self.authorized_follower.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [new_post, self.post]
+        )
+        self.authorized_follower.get(
+            reverse('posts:profile_unfollow', args=(self.following,))
+        )
+        self.assertFalse(self.follower.timeline.exists())
+
+    def test_backfill_timeline_command(self):
+        """Команда backfill_timeline восстанавливает ленты."""
+        Follow.objects.create(author=self.following, user=self.follower)
+        Timeline.objects.all().delete()
+        call_command('backfill_timeline', stdout=StringIO())
+        self.assertEqual(
+            list(self.follower.timeline.values_list('post', flat=True)),
+            [self.post.pk]
+        )
+
+
+class ListingCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.group_2 = Group.objects.create(title='Группа 2', slug='group-2')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Закэшированный пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_card_cache_is_kept_until_update(self):
+        """Карточка берётся из кэша, пока не сдвинется updated_at."""
+        # Гостю страница целиком пришла бы из кэша страниц.
+        self.client.force_login(self.user)
+        self.client.get(reverse('posts:index'))
+        posts = Post.objects.filter(pk=self.post.pk)
+        posts.update(excerpt='Без сигналов')
+        self.assertNotContains(
+            self.client.get(reverse('posts:index')), 'Без сигналов'
+        )
+        posts.update(updated_at=timezone.now())
+        self.assertContains(
+            self.client.get(reverse('posts:index')), 'Без сигналов'
+        )
+
+    def test_group_and_author_rename_refresh_cards(self):
+        """Новое название группы и имя автора видны в карточках."""
+        self.client.get(reverse('posts:index'))
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.user.first_name = 'Лев'
+        self.user.last_name = 'Толстой'
+        self.user.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'все записи группы Новое название')
+        self.assertContains(response, 'Лев Толстой')
+
+    def test_edit_invalidates_old_and_new_group(self):
+        """Перенос поста сбрасывает кэш обеих групп."""
+        old_url = reverse('posts:group_list', args=(self.group.slug,))
+        new_url = reverse('posts:group_list', args=(self.group_2.slug,))
+        self.assertContains(self.client.get(old_url), self.post.text)
+        self.assertNotContains(self.client.get(new_url), self.post.text)
+        self.post.group = self.group_2
+        self.post.save()
+        self.assertNotContains(self.client.get(old_url), self.post.text)
+        self.assertContains(self.client.get(new_url), self.post.text)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), TASKS_EAGER=True)
+class ThumbnailTests(TestCase):
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_thumbnails_uses_all_presets(self):
+        """Для картинки поста готовятся миниатюры всех размеров."""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        post = Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=small_gif,
+                content_type='image/gif'
+            ),
+        )
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            generate_thumbnails.delay(post.image.name)
+        self.assertEqual(
+            get_thumbnail.call_args_list,
+            [
+                mock.call(post.image.name, geometry, **options)
+                for geometry, options in settings.THUMBNAIL_PRESETS
+            ]
+        )
+
+    @mock.patch('posts.signals.transaction.on_commit', lambda func: func())
+    @mock.patch('posts.signals.generate_thumbnails')
+    def test_thumbnails_only_for_new_image(self, generate):
+        """Сохранение без новой картинки миниатюры не пересчитывает."""
+        group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            image=SimpleUploadedFile('group.gif', b'GIF89a'),
+        )
+        generate.delay.assert_called_once_with(group.image.name)
+        group.title = 'Другая'
+        group.save()
+        generate.delay.assert_called_once()
+        group.image = SimpleUploadedFile('other.gif', b'GIF89a')
+        group.save()
+        generate.delay.assert_called_with(group.image.name)
+        self.assertEqual(generate.delay.call_count, 2)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Рецепт борща с пампушками',
+        )
+        cls.commented = Post.objects.create(
+            author=cls.user,
+            text='Обычный пост',
+        )
+        Comment.objects.create(
+            post=cls.commented,
+            author=cls.user,
+            text='А где же борщ?',
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_posts_and_comments(self):
+        """Ищутся посты и комментарии, совпадение в посте выше."""
+        self.assertEqual(self.search('борщ'), [self.post, self.commented])
+        self.assertEqual(self.search('ПАМПУШ'), [self.post])
+        self.assertEqual(self.search('"); DROP TABLE'), [])
+
+    def test_index_follows_edits(self):
+        """Индекс обновляется при правке и удалении."""
+        self.post.text = 'Рецепт щей'
+        self.post.save()
+        self.assertEqual(self.search('борщ'), [self.commented])
+        self.commented.comments.all().delete()
+        self.assertEqual(self.search('борщ'), [])
+        self.assertEqual(self.search('щей'), [self.post])
+
+    def test_rebuild_search_index(self):
+        """Команда rebuild_search_index восстанавливает индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('борщ'), [self.post, self.commented])
+
+
+class ImportContentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(author=cls.author, user=cls.reader)
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def write(self, name, content):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write(content)
+        return path
+
+    def test_import_posts(self):
+        """Посты из JSONL попадают в ленты, счётчики и поиск."""
+        path = self.write('posts.jsonl', (
+            '{"author": "author", "group": "group", "text": "Старый пост",'
+            ' "pub_date": "2015-03-01T10:00:00"}\n'
+            '{"author": "nobody", "text": "Пропущенный"}\n'
+            '{"author": "author", "text": "Новый пост"}\n'
+        ))
+        call_command(
+            'import_content', path, kind='posts', batch_size=2,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        old, new = Post.objects.order_by('pub_date')
+        self.assertEqual(old.pub_date.year, 2015)
+        self.assertEqual(old.group, self.group)
+        self.assertEqual(
+            list(self.reader.timeline.values_list('post', flat=True)),
+            [new.pk, old.pk]
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).stats.posts_count, 2
+        )
+        self.assertFalse(
+            Post.objects.filter(text='Пропущенный').exists()
+        )
+
+    def test_resume_from_checkpoint(self):
+        """Импорт продолжается с сохранённой позиции."""
+        path = self.write('comments.csv', (
+            'post,author,text\n'
+            f'{self.make_post().pk},reader,Первый\n'
+            f'{Post.objects.get().pk},reader,Второй\n'
+        ))
+        ImportCheckpoint.objects.create(name=path, done=1)
+        call_command(
+            'import_content', path, kind='comments', stdout=StringIO()
+        )
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)), ['Второй']
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.reader.pk).stats.comments_count, 1
+        )
+
+    def test_import_comments_and_follows_bump_versions(self):
+        post = self.make_post()
+        scopes = (f'post:{post.pk}', f'author:{self.author.pk}')
+        before = listing_versions(scopes)
+        comments = self.write(
+            'comments.jsonl',
+            f'{{"post": {post.pk}, "author": "reader", "text": "Да"}}\n'
+        )
+        call_command(
+            'import_content', comments, kind='comments', stdout=StringIO()
+        )
+        after_comments = listing_versions(scopes)
+        self.assertNotEqual(after_comments[0], before[0])
+        follows = self.write(
+            'follows.jsonl', '{"user": "author", "author": "reader"}\n'
+        )
+        call_command(
+            'import_content', follows, kind='follows', stdout=StringIO()
+        )
+        self.assertNotEqual(listing_versions(scopes)[1], after_comments[1])
+
+    def test_checkpoint_is_saved_with_chunk(self):
+        """Прогресс коммитится вместе с пачкой и удаляется в конце."""
+        post = self.make_post()
+        path = self.write('comments.csv', (
+            'post,author,text\n'
+            f'{post.pk},reader,Первый\n'
+            'испорчен,reader,Второй\n'
+        ))
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_content', path, kind='comments', batch_size=1,
+                stdout=StringIO(),
+            )
+        self.assertEqual(ImportCheckpoint.objects.get(name=path).done, 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.write('comments.csv', (
+            'post,author,text\n'
+            f'{post.pk},reader,Первый\n'
+            f'{post.pk},reader,Второй\n'
+        ))
+        call_command(
+            'import_content', path, kind='comments', stdout=StringIO()
+        )
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_bad_post_id_names_the_line(self):
+        path = self.write('bad.csv', 'post,author,text\nпервый,reader,Да\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 1'):
+            call_command(
+                'import_content', path, kind='comments', stdout=StringIO()
+            )
+
+    def make_post(self):
+        return Post.objects.create(author=self.author, text='Пост')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        # Браузер получает CSRF-cookie ещё на странице входа.
+        self.reader_client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+
+    def assertNotModified(self, client, url, etag):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+
+    def test_unchanged_pages_return_304(self):
+        urls = (
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:group_list', args=(self.group.slug,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotIn('Last-Modified', response)
+                self.assertNotModified(self.client, url, response['ETag'])
+                reader_etag = self.reader_client.get(url)['ETag']
+                self.assertNotEqual(reader_etag, response['ETag'])
+
+    def test_rename_resets_own_page_and_commented_posts(self):
+        """У читателя нет постов, но есть профиль и комментарии."""
+        Comment.objects.create(post=self.post, author=self.reader, text='Да')
+        profile = reverse('posts:profile', args=(self.reader.username,))
+        post = reverse('posts:post_detail', args=(self.post.pk,))
+        etags = {url: self.client.get(url)['ETag'] for url in (profile, post)}
+        reader = User.objects.get(pk=self.reader.pk)
+        reader.first_name = 'Читатель'
+        reader.save()
+        response = self.client.get(profile, HTTP_IF_NONE_MATCH=etags[profile])
+        self.assertContains(response, 'Читатель')
+        reader.username = 'renamed'
+        reader.save()
+        response = self.client.get(post, HTTP_IF_NONE_MATCH=etags[post])
+        self.assertContains(response, 'renamed')
+
+    def test_new_csrf_token_resets_etag(self):
+        """После входа заново формы страницы нужны с новым токеном."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        etag = self.reader_client.get(url)['ETag']
+        self.assertNotModified(self.reader_client, url, etag)
+        self.reader_client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 64
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_reset_etag(self):
+        """Комментарий, новый пост автора и подписка меняют ETag."""
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        profile = reverse('posts:profile', args=(self.author.username,))
+        changes = (
+            (detail, lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий')),
+            (detail, lambda: Post.objects.create(
+                author=self.author, text='Ещё пост')),
+            (profile, lambda: Follow.objects.create(
+                user=self.reader, author=self.author)),
+        )
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.reader_client.get(url)['ETag']
+                self.assertNotModified(self.reader_client, url, etag)
+                change()
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+
+@override_settings(COMMENTS_NUMBER=3)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {number}'
+            )
+
+    def test_first_page_and_fragment(self):
+        """Пост показывает первую страницу, остальное отдаёт фрагмент."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 4', 'Комментарий 3', 'Комментарий 2']
+        )
+        more_url = (
+            reverse('posts:post_comments', args=(self.post.pk,))
+            + f'?after={comments.next_cursor}'
+        )
+        self.assertContains(response, more_url)
+        response = self.client.get(more_url)
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 1', 'Комментарий 0']
+        )
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_fragment_for_missing_post(self):
+        response = self.client.get(reverse('posts:post_comments', args=(0,)))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(POSTS_NUMBER=2)
+class TagTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_parse(self):
+        """Теги приводятся к нижнему регистру, почта и якоря пропускаются."""
+        text = ('#Django и #джанго, a#b, https://x.ru/#top, '
+                'пишите @reader. или mail@reader.ru')
+        self.assertEqual(parse_tags(text), {'django', 'джанго'})
+        self.assertEqual(parse_mentions(text), {'reader'})
+
+    def test_post_save_indexes_tags_and_mentions(self):
+        post = Post.objects.create(
+            author=self.author, text='#Кот для @reader и @nobody'
+        )
+        self.assertEqual(
+            list(post.tag_entries.values_list('tag__name', flat=True)),
+            ['кот'],
+        )
+        self.assertEqual(
+            list(self.reader.mentions.values_list('post', flat=True)),
+            [post.pk],
+        )
+        post.text = '#пёс без упоминаний'
+        post.save()
+        self.assertEqual(
+            list(post.tag_entries.values_list('tag__name', flat=True)),
+            ['пёс'],
+        )
+        self.assertFalse(self.reader.mentions.exists())
+
+    def test_tag_page_uses_cursor(self):
+        posts = [
+            Post.objects.create(author=self.author, text=f'#кот {number}')
+            for number in range(3)
+        ]
+        Post.objects.create(author=self.author, text='без тега')
+        response = self.client.get(reverse('posts:tag_posts', args=('КОТ',)))
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), posts[:0:-1])
+        response = self.client.get(
+            reverse('posts:tag_posts', args=('кот',)),
+            {'after': page_obj.next_cursor},
+        )
+        self.assertEqual(list(response.context['page_obj']), [posts[0]])
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:tag_posts', args=('пёс',))
+            ).status_code,
+            404,
+        )
+
+    def test_mentions_feed(self):
+        post = Post.objects.create(author=self.author, text='Привет, @reader')
+        Post.objects.create(author=self.author, text='Привет, @author')
+        response = self.client.get(reverse('posts:mentions'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_index_tags_command(self):
+        """Команда разбирает посты, созданные в обход сигналов."""
+        Post.objects.bulk_create([
+            Post(author=self.author, text='#кот и @reader'),
+            Post(author=self.author, text='#кот'),
+        ])
+        call_command('index_tags', batch_size=1, stdout=StringIO())
+        self.assertEqual(TaggedPost.objects.count(), 2)
+        self.assertEqual(Mention.objects.get().user, self.reader)
+        call_command('index_tags', stdout=StringIO())
+        self.assertEqual(TaggedPost.objects.count(), 2)
+
+
+@override_settings(VIEWS_FLUSH_HITS=3, VIEWS_FLUSH_INTERVAL=3600)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.other = Post.objects.create(author=cls.author, text='Другой')
+
+    def setUp(self):
+        cache.clear()
+        # Просмотры из других тестов относятся к постам с теми же pk.
+        BUFFERS['memory'].counts.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def views(self, post):
+        post.refresh_from_db(fields=('views_count',))
+        return post.views_count
+
+    @override_settings(VIEWS_BUFFER='memory')
+    def test_memory_buffer_flushes_every_n_hits(self):
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.views(self.post), 0)
+        self.client.get(url)
+        self.assertEqual(self.views(self.post), 3)
+
+    @override_settings(VIEWS_BUFFER='memory')
+    def test_warming_header_needs_signature(self):
+        """Без подписи заголовок прогрева просмотр не отменяет."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url, **{WARMING_HEADER: '1'})
+        self.assertEqual(BUFFERS['memory'].counts[self.post.pk], 1)
+
+    def test_write_views_is_one_update(self):
+        with self.assertNumQueries(1):
+            write_views({self.post.pk: 2, self.other.pk: 5})
+        self.assertEqual(self.views(self.post), 2)
+        self.assertEqual(self.views(self.other), 5)
+
+    @override_settings(VIEWS_BUFFER='cache', TASKS_EAGER=False)
+    def test_cache_buffer_queues_flush_once_per_epoch(self):
+        """Эпоху запишет задача, даже если просмотров больше не будет."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        self.client.get(url)
+        task = Task.objects.get()
+        self.assertEqual(task.name, 'posts.counters.flush_cache_views')
+        self.assertGreater(task.run_at, timezone.now())
+
+    @override_settings(VIEWS_BUFFER='cache')
+    def test_cache_buffer_writes_closed_epoch_once(self):
+        """Эпоха, которую не успели убрать из кэша, не пишется повторно."""
+        buffer = BUFFERS['cache']
+        with mock.patch.object(buffer, 'epoch', return_value=100):
+            for post in (self.post, self.post, self.other):
+                buffer.add(post.pk)
+            counts, keys = buffer.read(100)
+        self.assertEqual(counts, {self.post.pk: 2, self.other.pk: 1})
+        with mock.patch.object(buffer, 'epoch', return_value=101):
+            self.assertEqual(buffer.flush(), 0)
+        leftover = cache.get_many(keys)
+        with mock.patch.object(buffer, 'epoch', return_value=102):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.views(self.post), 2)
+        self.assertTrue(ViewFlush.objects.filter(epoch=100).exists())
+        # Воркер упал после коммита, ключи эпохи остались в кэше.
+        cache.set_many(leftover)
+        with mock.patch.object(buffer, 'epoch', return_value=103):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(self.views(self.post), 2)
+        self.assertEqual(self.views(self.other), 1)
+
+
+class LikeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+            for number in range(3)
+        ]
+        cls.post = cls.posts[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def likes(self, post):
+        post.refresh_from_db(fields=('likes_count',))
+        return post.likes_count
+
+    def test_like_and_unlike(self):
+        """Лайк пишется в долю счётчика и переносится в пост слиянием."""
+        like_url = reverse('posts:post_like', args=(self.post.pk,))
+        response = self.client.post(like_url, {'next': '/'})
+        self.assertRedirects(response, '/')
+        self.client.post(like_url)
+        self.assertEqual(Like.objects.get().user, self.reader)
+        self.assertEqual(self.likes(self.post), 1)
+        self.assertFalse(LikeCounter.objects.exclude(count=0).exists())
+        cache.clear()
+        response = self.client.post(
+            reverse('posts:post_unlike', args=(self.post.pk,)),
+            {'next': 'https://example.com/'},
+        )
+        self.assertRedirects(
+            response, reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(self.likes(self.post), 0)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_like_changes_only_likers_etag(self):
+        """Общие страницы сбрасывает слияние, а не каждый лайк."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        scopes = ('index', f'post:{self.post.pk}', f'author:{self.author.pk}')
+        before = listing_versions(scopes)
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('posts:post_like', args=(self.post.pk,)))
+        self.assertEqual(listing_versions(scopes), before)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, reverse('posts:post_unlike', args=(self.post.pk,))
+        )
+        merge_like_counters()
+        self.assertNotEqual(listing_versions(scopes)[0], before[0])
+        self.assertEqual(self.likes(self.post), 1)
+
+    def test_like_needs_post(self):
+        response = self.client.get(
+            reverse('posts:post_like', args=(self.post.pk,))
+        )
+        self.assertEqual(response.status_code, 405)
+
+    def test_liked_lookup_is_one_query(self):
+        Like.objects.create(user=self.reader, post=self.posts[1])
+        with self.assertNumQueries(1):
+            liked = liked_post_ids(self.reader, self.posts)
+        self.assertEqual(liked, {self.posts[1].pk})
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, reverse('posts:post_unlike', args=(self.posts[1].pk,))
+        )
+        self.assertContains(
+            response, reverse('posts:post_like', args=(self.post.pk,))
+        )
+
+    def test_merge_sums_all_shards_of_post(self):
+        """Лайк и его снятие в разных долях не уводят счётчик ниже нуля."""
+        Post.objects.filter(pk=self.post.pk).update(likes_count=1)
+        LikeCounter.objects.bulk_create([
+            LikeCounter(post=self.post, shard=0, count=-1),
+            LikeCounter(post=self.post, shard=1, count=1),
+            LikeCounter(post=self.post, shard=2, count=-1),
+            LikeCounter(post=self.posts[1], shard=0, count=2),
+        ])
+        self.assertEqual(merge_like_counters(batch_size=1), 2)
+        self.assertEqual(self.likes(self.post), 0)
+        self.assertEqual(self.likes(self.posts[1]), 2)
+        self.assertEqual(merge_like_counters(), 0)
+
+    def test_recount_likes(self):
+        Like.objects.create(user=self.reader, post=self.post)
+        Post.objects.filter(pk=self.posts[1].pk).update(likes_count=5)
+        LikeCounter.objects.create(post=self.post, shard=0, count=3)
+        scopes = (f'post:{self.posts[1].pk}', 'index')
+        before = listing_versions(scopes)
+        self.assertEqual(Post.cached.get(pk=self.posts[1].pk).likes_count, 5)
+        self.assertEqual(recount_likes(), 2)
+        self.assertEqual(self.likes(self.post), 1)
+        self.assertEqual(self.likes(self.posts[1]), 0)
+        self.assertFalse(LikeCounter.objects.exists())
+        # Исправленные числа видны сразу, как после слияния.
+        self.assertEqual(Post.cached.get(pk=self.posts[1].pk).likes_count, 0)
+        after = listing_versions(scopes)
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.reader, group=cls.other_group, text='Другой пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        BUFFERS['memory'].counts.clear()
+
+    def assertCached(self, url, state):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get('X-Page-Cache'), state, url)
+        return response
+
+    def test_anonymous_pages_are_cached_with_surrogate_keys(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertCached(url, 'MISS')
+                response = self.assertCached(url, 'HIT')
+                self.assertIn(
+                    f'post-{self.post.pk}', response['Surrogate-Key']
+                )
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertNotIn('s-maxage', response['Cache-Control'])
+        self.assertEqual(
+            set(self.client.get(urls[0])['Surrogate-Key'].split()),
+            {'index', f'post-{self.post.pk}', f'post-{self.other_post.pk}'},
+        )
+
+    def test_writes_purge_only_affected_pages(self):
+        index = reverse('posts:index')
+        group = reverse('posts:group_list', args=(self.group.slug,))
+        other_group = reverse(
+            'posts:group_list', args=(self.other_group.slug,)
+        )
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        profile = reverse('posts:profile', args=(self.author.username,))
+        for url in (index, group, other_group, detail, profile):
+            self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertContains(self.assertCached(detail, 'MISS'), 'Комментарий')
+        self.assertCached(other_group, 'HIT')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertCached(profile, 'MISS')
+        self.assertCached(other_group, 'HIT')
+        Post.objects.create(author=self.author, group=self.group, text='Новый')
+        self.assertContains(self.assertCached(index, 'MISS'), 'Новый')
+        self.assertContains(self.assertCached(group, 'MISS'), 'Новый')
+        self.assertCached(other_group, 'HIT')
+
+    def test_stale_page_while_other_request_renders(self):
+        """Пока один запрос рендерит новую версию, другие получают старую."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Новый')
+        key = page_key(RequestFactory().get(url))
+        token = acquire(key)
+        self.assertTrue(token)
+        self.assertNotContains(self.assertCached(url, 'STALE'), 'Новый')
+        release(key, token)
+        self.assertContains(self.assertCached(url, 'MISS'), 'Новый')
+        self.assertCached(url, 'HIT')
+
+    def test_cold_page_is_rendered_once(self):
+        """Пока страницу рендерит другой запрос, этот ждёт его записи."""
+        url = reverse('posts:index')
+        key = page_key(RequestFactory().get(url))
+        token = acquire(key)
+        self.assertTrue(token)
+        with mock.patch('time.sleep', side_effect=lambda seconds: (
+                release(key, token), self.client.get(url))):
+            response = self.assertCached(url, 'HIT')
+        self.assertContains(response, 'Пост')
+
+    def test_users_and_missing_pages_are_not_cached(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.client.logout()
+        url = reverse('posts:post_detail', args=(0,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(VIEWS_BUFFER='memory')
+    def test_cached_post_page_counts_views(self):
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertCached(url, 'MISS')
+        self.assertCached(url, 'HIT')
+        self.assertEqual(BUFFERS['memory'].counts[self.post.pk], 2)
+
+
+class TieredCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        tiered_cache.clear_local()
+        self.client.force_login(self.author)
+
+    def test_group_and_author_come_from_l1(self):
+        urls = (
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+        )
+        for url in urls:
+            self.client.get(url)
+        hits = tiered_cache.stats()['l1']['hits']
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        # Области страницы и сама view: два чтения на страницу.
+        self.assertEqual(tiered_cache.stats()['l1']['hits'], hits + 4)
+
+    def test_renamed_group_and_author_are_forgotten(self):
+        old_url = reverse('posts:group_list', args=(self.group.slug,))
+        profile = reverse('posts:profile', args=(self.author.username,))
+        self.client.get(old_url)
+        self.client.get(profile)
+        self.group.slug = 'renamed'
+        self.group.save()
+        self.author.last_name = 'Николаевич'
+        self.author.save()
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        new_url = reverse('posts:group_list', args=('renamed',))
+        self.assertEqual(self.client.get(new_url).status_code, 200)
+        self.assertContains(self.client.get(profile), 'Лев Николаевич')
+
+    def test_login_keeps_cached_author(self):
+        profile = reverse('posts:profile', args=(self.author.username,))
+        self.client.get(profile)
+        generation = cache.get('tiered:generation')
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(cache.get('tiered:generation'), generation)
+
+
+class WarmCacheTests(TransactionTestCase):
+    """Пул потоков ходит в базу своими соединениями, поэтому данные
+    должны быть закоммичены."""
+
+    def setUp(self):
+        cache.clear()
+        BUFFERS['memory'].counts.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост #тег'
+        )
+
+    def test_hot_pages_are_cached_for_guests(self):
+        out = StringIO()
+        call_command('warm_cache', workers=2, stdout=out)
+        self.assertIn('Прогрето страниц: 5,', out.getvalue())
+        self.assertIn('ошибок: 0', out.getvalue())
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['X-Page-Cache'], 'HIT')
+        # Прогрев просмотром поста не считается.
+        self.assertNotIn(self.post.pk, BUFFERS['memory'].counts)
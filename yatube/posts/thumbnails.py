@@ -0,0 +1,15 @@
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import task
+
+
+@task(max_attempts=3)
+def generate_thumbnails(name):
+    """Готовит все миниатюры картинки заранее.
+
+    Тег {% thumbnail %} найдёт их в KVStore sorl и не будет пересчитывать
+    картинку внутри запроса; если миниатюры ещё нет, шаблон создаст её сам.
+    """
+    for geometry, options in settings.THUMBNAIL_PRESETS:
+        get_thumbnail(name, geometry, **options)
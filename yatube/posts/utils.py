@@ -1,8 +1,389 @@
+import binascii
+import hashlib
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Sequence
+from contextlib import contextmanager
+
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, When
+from django.views.decorators.http import condition
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import (AuthorStats, Comment, Follow, Group, Post, Timeline,
+                     User)
+
+
+def encode_cursor(obj, key='pk', date_field='pub_date'):
+    """Непрозрачный курсор для ключа пагинации (дата, id)."""
+    date = getattr(obj, date_field)
+    return urlsafe_base64_encode(
+        force_bytes(f'{date.isoformat()}|{getattr(obj, key)}')
+    )
+
+
+def decode_cursor(cursor):
+    """Курсор в пару (дата, id) или None, если курсор испорчен."""
+    try:
+        pub_date, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Sequence):
+    """Страница keyset-пагинации: без COUNT(*) и без OFFSET."""
+
+    paginator = None
+    number = None
+
+    def __init__(self, object_list, has_next, has_previous, key='pk',
+                 date_field='pub_date'):
+        self.object_list = object_list
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+        self.next_cursor = self.previous_cursor = None
+        if self._has_next:
+            self.next_cursor = encode_cursor(object_list[-1], key, date_field)
+        if self._has_previous:
+            self.previous_cursor = encode_cursor(
+                object_list[0], key, date_field
+            )
+        self._start = (
+            encode_cursor(object_list[0], key, date_field)
+            if object_list else ''
+        )
+
+    def __repr__(self):
+        return f'<Cursor page from {self._start or "(empty)"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
 
 
-def get_page_context(request, post_list):
+def get_cursor_page(post_list, after=None, before=None, per_page=None,
+                    key='pk', date_field='pub_date'):
+    """Страница после/до курсора в порядке (-дата, -key)."""
+    per_page = per_page or settings.POSTS_NUMBER
+    if before:
+        cursor = decode_cursor(before)
+        if cursor is not None:
+            date, pk = cursor
+            posts = list(post_list.filter(
+                Q(**{f'{date_field}__gt': date})
+                | Q(**{date_field: date, f'{key}__gt': pk})
+            ).order_by(date_field, key)[:per_page + 1])
+            has_previous = len(posts) > per_page
+            posts = posts[:per_page]
+            posts.reverse()
+            return CursorPage(posts, True, has_previous, key, date_field)
+    cursor = decode_cursor(after) if after else None
+    post_list = post_list.order_by(f'-{date_field}', f'-{key}')
+    if cursor is not None:
+        date, pk = cursor
+        post_list = post_list.filter(
+            Q(**{f'{date_field}__lt': date})
+            | Q(**{date_field: date, f'{key}__lt': pk})
+        )
+    posts = list(post_list[:per_page + 1])
+    return CursorPage(
+        posts[:per_page], len(posts) > per_page, cursor is not None, key,
+        date_field,
+    )
+
+
+def get_comments_page(post, after=None):
+    """Комментарии поста по COMMENTS_NUMBER, от новых к старым."""
+    return get_cursor_page(
+        post.comments.select_related('author'),
+        after=after,
+        per_page=settings.COMMENTS_NUMBER,
+        date_field='created',
+    )
+
+
+def get_page_context(request, post_list, key='pk'):
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        return get_cursor_page(
+            post_list, after=after, before=before, key=key
+        )
     paginator = Paginator(post_list, settings.POSTS_NUMBER)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    page_obj = paginator.get_page(page_number)
+    page_obj.next_cursor = (
+        encode_cursor(page_obj[-1], key) if page_obj.has_next() else None
+    )
+    return page_obj
+
+
+def get_entries_page(request, entries):
+    """Посты из ленты или индекса (Timeline, TaggedPost, Mention) по курсору.
+
+    Страницы по номеру здесь нет: COUNT(*) и OFFSET по большому тегу
+    стоили бы дороже самой страницы.
+    """
+    page_obj = get_cursor_page(
+        entries,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        key='post_id',
+    )
+    page_obj.object_list = [entry.post for entry in page_obj]
+    return page_obj
+
+
+def backfill_timeline(user_id, author_id, batch_size=1000):
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts.iterator()
+        ),
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_posts(posts, batch_size=1000):
+    """Раскладывает уже сохранённые посты по лентам подписчиков.
+
+    Нужна после bulk_create: сигнал fan_out_post при нём не срабатывает.
+    """
+    rows = list(posts.values_list('pk', 'author_id', 'pub_date'))
+    followers = defaultdict(list)
+    follows = Follow.objects.filter(
+        author_id__in={author_id for _, author_id, _ in rows}
+    ).values_list('author_id', 'user_id')
+    for author_id, user_id in follows:
+        followers[author_id].append(user_id)
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, author_id, pub_date in rows
+            for user_id in followers[author_id]
+        ),
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет bulk_create записать свои даты в полях auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def increment_counts(queryset, field, counts):
+    """Прибавляет {pk: n} к полю одним UPDATE ... CASE."""
+    if not counts:
+        return
+    by_delta = defaultdict(list)
+    for pk, delta in counts.items():
+        by_delta[delta].append(pk)
+    queryset.filter(pk__in=counts).update(**{field: Case(
+        *(
+            When(pk__in=pks, then=F(field) + delta)
+            for delta, pks in by_delta.items()
+        ),
+        default=F(field),
+    )})
+
+
+def recount_author_stats():
+    """Пересчитывает счётчики авторов, возвращает id исправленных.
+
+    bulk_update сигналов не шлёт, поэтому версии их профилей и постов
+    сдвигаются здесь.
+    """
+    sources = {
+        'posts_count': Post.objects.values_list('author'),
+        'follows_count': Follow.objects.values_list('user'),
+        'followers_count': Follow.objects.values_list('author'),
+        'comments_count': Comment.objects.values_list('author'),
+    }
+    totals = {
+        field: dict(queryset.annotate(total=Count('pk')).order_by())
+        for field, queryset in sources.items()
+    }
+    stats = AuthorStats.objects.in_bulk(field_name='user_id')
+    created, changed = [], []
+    for user_id in User.objects.values_list('pk', flat=True).iterator():
+        counters = {
+            field: total.get(user_id, 0) for field, total in totals.items()
+        }
+        row = stats.get(user_id)
+        if row is None:
+            created.append(AuthorStats(user_id=user_id, **counters))
+        elif any(getattr(row, f) != v for f, v in counters.items()):
+            for field, value in counters.items():
+                setattr(row, field, value)
+            changed.append(row)
+    AuthorStats.objects.bulk_create(created, batch_size=1000)
+    AuthorStats.objects.bulk_update(changed, list(sources), batch_size=1000)
+    fixed = [row.user_id for row in (*created, *changed)]
+    bump_listing_versions(*(f'author:{pk}' for pk in fixed))
+    return fixed
+
+
+def new_version():
+    """Случайная версия с временем смены в начале: '<unix time>.<hex>'."""
+    return f'{int(time.time())}.{uuid.uuid4().hex}'
+
+
+def listing_versions(scopes):
+    """Текущие версии списков постов или постов одним чтением кэша.
+
+    Области: 'index', 'group:<id>', 'author:<id>', 'post:<id>' и
+    'likes:<id пользователя>' — его лайки.
+    """
+    keys = [f'posts:listing:{scope}' for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), None)
+        found.update(cache.get_many(missing))
+    return [found.get(key) for key in keys]
+
+
+def bump_listing_versions(*scopes):
+    """Сбрасывает кэш списков сразу и ещё раз после коммита транзакции.
+
+    Версия — случайная строка, а не счётчик: если ключ версии вытеснят
+    из кэша, старые фрагменты не совпадут с новой версией.
+    """
+    def bump():
+        cache.set_many(
+            {f'posts:listing:{scope}': new_version() for scope in scopes},
+            None,
+        )
+    bump()
+    transaction.on_commit(bump)
+
+
+def touch_posts(posts):
+    """Сдвигает updated_at, чтобы карточки постов отрендерились заново.
+
+    Нужна, когда меняется то, что показано в карточке, но хранится не
+    в посте: название группы или имя автора.
+    """
+    rows = posts.order_by().values_list('author_id', 'group_id').distinct()
+    scopes = {'index'}
+    for author_id, group_id in rows:
+        scopes.add(f'author:{author_id}')
+        if group_id:
+            scopes.add(f'group:{group_id}')
+    posts.update(updated_at=timezone.now())
+    bump_listing_versions(*scopes)
+
+
+def request_scopes(request, scopes_func, *args, **kwargs):
+    """Области страницы; считаются один раз на запрос."""
+    if not hasattr(request, 'listing_scopes'):
+        request.listing_scopes = scopes_func(request, *args, **kwargs)
+    return request.listing_scopes
+
+
+def index_scopes(request):
+    return ('index',)
+
+
+def group_scopes(request, slug):
+    try:
+        return (f'group:{Group.cached.get(slug=slug).pk}',)
+    except Group.DoesNotExist:
+        return None
+
+
+def post_scopes(request, post_id):
+    """Пост с комментариями, его автор и группа: имя автора, его
+    счётчики и название группы видны на странице поста."""
+    try:
+        post = Post.cached.get(pk=post_id)
+    except Post.DoesNotExist:
+        return None
+    scopes = (f'post:{post.pk}', f'author:{post.author_id}')
+    if post.group_id:
+        scopes += (f'group:{post.group_id}',)
+    return scopes
+
+
+def author_scopes(request, username):
+    try:
+        return (f'author:{User.cached.get(username=username).pk}',)
+    except User.DoesNotExist:
+        return None
+
+
+def viewer_tag(request):
+    """Часть ETag про пользователя: id и отпечаток CSRF-cookie.
+
+    Вход меняет CSRF-секрет, и страница со старым csrfmiddlewaretoken в
+    формах не должна вернуться из кэша браузера ответом 304.
+    """
+    if not request.user.is_authenticated:
+        return 'user0'
+    secret = request.META.get('CSRF_COOKIE', '').encode()
+    return f'user{request.user.pk}.{hashlib.md5(secret).hexdigest()[:12]}'
+
+
+def versioned(scopes_func, per_user=False):
+    """condition() с версиями областей кэша вместо ETag.
+
+    scopes_func получает аргументы view и возвращает области или None,
+    если объекта нет: тогда view отвечает как обычно, то есть 404.
+    Страницы с per_user зависят от пользователя, поэтому в ETag входит
+    viewer_tag() и версия его лайков: кнопка лайка тоже часть страницы.
+    Last-Modified не отдаётся: с точностью до секунды он ответил бы 304
+    на изменение в ту же секунду, что и прошлый ответ.
+    """
+    def versions(request, *args, **kwargs):
+        if not hasattr(request, 'listing_versions'):
+            scopes = request_scopes(request, scopes_func, *args, **kwargs)
+            if scopes and per_user and request.user.is_authenticated:
+                scopes = [*scopes, f'likes:{request.user.pk}']
+            request.listing_versions = scopes and listing_versions(scopes)
+        return request.listing_versions
+
+    def etag(request, *args, **kwargs):
+        current = versions(request, *args, **kwargs)
+        if not current:
+            return None
+        if per_user:
+            current = [*current, viewer_tag(request)]
+        return '-'.join(current)
+
+    return condition(etag_func=etag)
@@ -1,13 +1,29 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import is_safe_url, urlencode
+from django.views.decorators.http import require_POST
 
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import get_page_context
-
+from core.managers import get_cached_or_404
+from core.middleware import query_budget
 
+from .counters import count_view
+from .forms import CommentForm, PostForm
+from .likes import add_like, liked_post_ids, remove_like
+from .models import AuthorStats, Follow, Group, Post, Tag, User
+from .pagecache import anonymous_page_cache
+from .search import search_posts
+from .tasks import schedule_merge_likes
+from .utils import (author_scopes, get_comments_page, get_entries_page,
+                    get_page_context, group_scopes, index_scopes, post_scopes,
+                    versioned)
+
+
+@query_budget(5)
+@anonymous_page_cache(index_scopes)
 def index(request):
-    post_list = Post.objects.select_related('author', 'group')
+    post_list = Post.objects.select_related('author', 'group').defer('text')
     page_obj = get_page_context(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -16,9 +32,20 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+def attach_stats(author):
+    """Счётчики автора: в кэше лежит только сам пользователь."""
+    stats = AuthorStats.objects.filter(user_id=author.pk).first()
+    if stats is not None:
+        author.stats = stats
+    return author
+
+
+@query_budget(6)
+@versioned(group_scopes, per_user=True)
+@anonymous_page_cache(group_scopes)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('author').all()
+    group = get_cached_or_404(Group.cached, slug=slug)
+    post_list = group.posts.select_related('author').defer('text')
     page_obj = get_page_context(request, post_list)
     context = {
         'group': group,
@@ -28,9 +55,13 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(8)
+@versioned(author_scopes, per_user=True)
+@anonymous_page_cache(author_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group').all()
+    author = get_cached_or_404(User.cached, username=username)
+    attach_stats(author)
+    post_list = author.posts.select_related('group').defer('text')
     page_obj = get_page_context(request, post_list)
     following = (
         request.user.is_authenticated
@@ -41,17 +72,21 @@ def profile(request, username):
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+# Ещё один запрос — задача записи просмотров, раз в эпоху счётчика.
+@query_budget(9)
+@count_view
+@versioned(post_scopes, per_user=True)
+@anonymous_page_cache(post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(
-        Post.objects.select_related('author').prefetch_related(
-            'comments__author'),
-        pk=post_id
-    )
+    post = get_cached_or_404(Post.cached, pk=post_id)
+    post.author = attach_stats(User.cached.get(pk=post.author_id))
+    if post.group_id:
+        post.group = Group.cached.get(pk=post.group_id)
     form = CommentForm(
         request.POST or None,
         files=request.FILES or None
@@ -59,11 +94,48 @@ def post_detail(request, post_id):
     context = {
         'post': post,
         'form': form,
-        'comments': post.comments.all(),
+        'comments': get_comments_page(post),
+        'liked': post.pk in liked_post_ids(request.user, [post]),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(2)
+def post_comments(request, post_id):
+    """Следующая страница комментариев фрагментом для «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': get_comments_page(post, request.GET.get('after')),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+@query_budget(6)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_posts(query), settings.POSTS_NUMBER)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(5)
+def tag_posts(request, name):
+    tag = get_object_or_404(Tag, name=name.lower())
+    entries = tag.entries.select_related(
+        'post__author', 'post__group'
+    ).defer('post__text')
+    context = {
+        'tag': tag,
+        'page_obj': get_entries_page(request, entries),
+    }
+    return render(request, 'posts/tag.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -80,9 +152,12 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    if post.author != request.user:
+    post = get_cached_or_404(Post.cached, pk=post_id)
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
+    if request.method == 'POST':
+        # Сохраняются все поля, а счётчики в кэше могли отстать.
+        post = get_object_or_404(Post, pk=post_id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
@@ -99,7 +174,7 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_cached_or_404(Post.cached, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -110,14 +185,52 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(5)
 def follow_index(request):
-    posts = Post.objects.select_related('author').filter(
-        author__following__user=request.user
-    )
-    context = {'page_obj': get_page_context(request, posts)}
+    timeline = request.user.timeline.select_related(
+        'post__author', 'post__group'
+    ).defer('post__text')
+    page_obj = get_page_context(request, timeline, key='post_id')
+    page_obj.object_list = [entry.post for entry in page_obj]
+    context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
+@login_required
+@query_budget(4)
+def mentions(request):
+    entries = request.user.mentions.select_related(
+        'post__author', 'post__group'
+    ).defer('post__text')
+    context = {'page_obj': get_entries_page(request, entries)}
+    return render(request, 'posts/mentions.html', context)
+
+
+def redirect_back(request, post):
+    next_url = request.POST.get('next')
+    if next_url and is_safe_url(next_url, {request.get_host()}):
+        return redirect(next_url)
+    return redirect('posts:post_detail', post.pk)
+
+
+@login_required
+@require_POST
+def post_like(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if add_like(request.user, post):
+        schedule_merge_likes()
+    return redirect_back(request, post)
+
+
+@login_required
+@require_POST
+def post_unlike(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if remove_like(request.user, post):
+        schedule_merge_likes()
+    return redirect_back(request, post)
+
+
 @login_required
 def profile_follow(request, username):
     if username != request.user.username:
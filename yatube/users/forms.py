@@ -1,10 +1,31 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+
+from .tasks import send_password_reset
 
 User = get_user_model()
 
+# Токен и uid воркер делает сам: в core_task.args и в админке мёртвых
+# задач не должно быть рабочей ссылки сброса.
+SECRET_CONTEXT = ('user', 'uid', 'token')
+
 
 class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Письмо собирает и отправляет воркер."""
+
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        send_password_reset.delay(
+            context['user'].pk,
+            {key: value for key, value in context.items()
+             if key not in SECRET_CONTEXT},
+            subject_template_name, email_template_name, from_email,
+            to_email, html_email_template_name,
+        )
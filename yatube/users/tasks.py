@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.tasks import task
+
+User = get_user_model()
+
+
+@task()
+def send_email(subject, body, from_email, to, html_message=None):
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html_message:
+        message.attach_alternative(html_message, 'text/html')
+    message.send()
+
+
+@task()
+def send_password_reset(user_pk, context, subject_template_name,
+                        email_template_name, from_email, to_email,
+                        html_email_template_name=None):
+    """Ссылку со свежим токеном подписывает воркер: в очереди её нет."""
+    user = User._default_manager.filter(pk=user_pk).first()
+    if user is None:
+        return
+    context = {
+        **context,
+        'user': user,
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': default_token_generator.make_token(user),
+    }
+    subject = render_to_string(subject_template_name, context)
+    body = render_to_string(email_template_name, context)
+    html_message = None
+    if html_email_template_name is not None:
+        html_message = render_to_string(html_email_template_name, context)
+    send_email(
+        ''.join(subject.splitlines()), body, from_email, [to_email],
+        html_message,
+    )
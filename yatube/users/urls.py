@@ -10,6 +10,7 @@ from django.contrib.auth.views import (
     PasswordResetConfirmView
 )
 from django.urls import path
+from users.forms import QueuedPasswordResetForm
 from users.views import SignUp
 
 
@@ -50,7 +51,8 @@ urlpatterns = [
     path(
         'password_reset/',
         PasswordResetView.as_view(
-            template_name='users/password_reset_form.html'),
+            template_name='users/password_reset_form.html',
+            form_class=QueuedPasswordResetForm),
         name='password_reset'
     ),
     path(
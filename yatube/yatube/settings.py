@@ -13,6 +13,12 @@ ALLOWED_HOSTS = [
     '[::1]',
     'testserver',
 ]
+# Только этим адресам (и при DEBUG) отдаются заголовки X-DB-* со
+# статистикой запросов к базе.
+INTERNAL_IPS = [
+    '127.0.0.1',
+    '::1',
+]
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -29,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,6 +103,7 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 POSTS_NUMBER = 10
+COMMENTS_NUMBER = 20
 
 NUMS_POSTS_AFTER_EDIT_PAGE = 0
 
@@ -111,10 +119,69 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Должны совпадать с аргументами {% thumbnail %} в шаблонах постов.
+THUMBNAIL_PRESETS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Отложенные задачи (письма, миниатюры, ленты подписчиков) выполняет
+# manage.py runworker; с TASKS_EAGER они идут сразу, так их запускают
+# тесты и bench (core.testing.isolated_settings).
+TASKS_EAGER = False
 FOLLOW_NUMS = 2
 
+# Просмотры постов пишутся в базу пачкой раз в VIEWS_FLUSH_INTERVAL
+# секунд. 'cache' копит их в общем кэше для всех воркеров и переживает
+# перезапуск воркера. 'memory' копит их в каждом процессе и пишет на
+# следующем просмотре после VIEWS_FLUSH_HITS просмотров или интервала:
+# на простаивающем воркере они ждут, а при падении теряются.
+VIEWS_BUFFER = 'cache'
+VIEWS_FLUSH_INTERVAL = 10
+VIEWS_FLUSH_HITS = 100
+# Сколько живёт страница для гостей в кэше страниц; обычно раньше её
+# сбрасывает смена версии по суррогатному ключу.
+PAGE_CACHE_TIMEOUT = 600
+# Через сколько секунд после лайка доли счётчика переносятся в пост.
+LIKES_MERGE_INTERVAL = 10
+# Группы и авторы по slug и имени лежат в LRU каждого процесса перед
+# общим кэшем (core.tiered). Изменение из другого воркера доходит до
+# LRU не позже чем через TIERED_CACHE_CHECK_INTERVAL секунд.
+TIERED_CACHE_SIZE = 1000
+TIERED_CACHE_CHECK_INTERVAL = 1
+TIERED_CACHE_TIMEOUT = 300
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {
+            '()': 'django.utils.log.RequireDebugTrue',
+        },
+    },
+    'handlers': {
+        'queries': {
+            'level': 'INFO',
+            'filters': ['require_debug_true'],
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.queries': {
+            'handlers': ['queries'],
+            'level': 'INFO',
+        },
+    },
+}
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 4,
+        },
     }
 }
+# Тесты получают свои кэш и MEDIA_ROOT во временной папке.
+TEST_RUNNER = 'core.testing.IsolatedTestRunner'